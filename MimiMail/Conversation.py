@@ -0,0 +1,58 @@
+class Conversation:
+    """A thread of messages shown as one row in the list.
+
+    messages are the thread's Messages, oldest first, with bodies that are
+    not fetched yet. load_bodies fetches all of them at once when the
+    conversation is expanded.
+    """
+    __slots__ = ('id', 'messages', '_load_bodies')
+
+    # Sender names shown in the row before the rest are counted
+    MAX_NAMES = 3
+
+    def __init__(self, id, messages, load_bodies=None):
+        self.id = id
+        self.messages = messages
+        self._load_bodies = load_bodies
+
+    @property
+    def latest(self):
+        return self.messages[-1]
+
+    @property
+    def subject(self):
+        return self.messages[0].subject
+
+    def get_sender_names(self):
+        """Return the distinct sender names, in the order they first wrote."""
+        names = []
+        for message in self.messages:
+            name = message.get_sender_name()
+            if name not in names:
+                names.append(name)
+        return names
+
+    def _names(self):
+        names = self.get_sender_names()
+        if len(names) > self.MAX_NAMES:
+            return ', '.join(names[:self.MAX_NAMES]) + f' +{len(names) - self.MAX_NAMES}'
+        return ', '.join(names)
+
+    def load_bodies(self):
+        """Fetch the bodies of every message in the thread, if they can be fetched in bulk."""
+        if self._load_bodies is not None:
+            self._load_bodies()
+
+    def get_date_for_display(self):
+        return self.latest.get_date_for_display()
+
+    def get_speech_summary(self):
+        """Get the text to speak when this conversation is selected in the list."""
+        count = len(self.messages)
+        if count == 1:
+            return self.latest.get_speech_summary()
+        return (f"Conversation with {self._names()}, {count} messages, Subject: {self.subject}. "
+                f"Last message received on {self.latest.get_date_for_speech()}")
+
+    def __repr__(self):
+        return f'{self.get_date_for_display():<10} From:{self._names():<25} ({len(self.messages)}) Subject:{self.subject}'
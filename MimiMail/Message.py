@@ -1,17 +1,93 @@
 import time
-from dataclasses import dataclass
+from datetime import date
 from email.utils import parsedate_tz, mktime_tz
-from datetime import datetime, timedelta
 
-@dataclass
+
+class _Today:
+    """Facts about the current local day that the date strings depend on."""
+    __slots__ = ('start', 'end', 'date', 'iso_week', 'weekday')
+
+    def __init__(self, now):
+        local = time.localtime(now)
+        self.start = time.mktime((local.tm_year, local.tm_mon, local.tm_mday, 0, 0, 0, 0, 0, -1))
+        self.end = time.mktime((local.tm_year, local.tm_mon, local.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+        self.date = date(local.tm_year, local.tm_mon, local.tm_mday)
+        self.iso_week = self.date.isocalendar()[1]
+        self.weekday = self.date.weekday()
+
+
+_today = None
+
+
+def _current_day():
+    """Return the _Today for now, rebuilding it only when the day rolls over."""
+    global _today
+    now = time.time()
+    if _today is None or not _today.start <= now < _today.end:
+        _today = _Today(now)
+    return _today
+
+
 class Message:
-    sender: str
-    sent_date: str
-    subject: str
-    body: dict
+    """A message as shown in the list.
+
+    Slotted to keep rows small. The Date header is parsed into epoch seconds
+    the first time a date is needed, and the display and speech date strings
+    are memoized until the calendar day changes.
+    """
+    __slots__ = ('sender', 'subject', 'body', 'id', '_raw_date', '_epoch', '_memo_day', '_display', '_speech')
+
+    def __init__(self, sender, sent_date, subject, body, id=None):
+        """sent_date is either the Date header or epoch seconds."""
+        self.sender = sender
+        self.subject = subject
+        self.body = body
+        self.id = id
+        if isinstance(sent_date, (int, float)):
+            self._raw_date = None
+            self._epoch = int(sent_date)
+        else:
+            self._raw_date = sent_date
+            self._epoch = None
+        self._memo_day = None
 
-    def __post_init__(self):
-        self.sent_date = time.localtime(mktime_tz(parsedate_tz(self.sent_date)))
+    @property
+    def epoch(self):
+        """Sent time in seconds since the epoch; 0 if the Date header can't be parsed."""
+        if self._epoch is None:
+            parsed = parsedate_tz(self._raw_date) if self._raw_date else None
+            self._epoch = mktime_tz(parsed) if parsed else 0
+            self._raw_date = None
+        return self._epoch
+
+    @property
+    def sent_date(self):
+        """Sent time as a local struct_time."""
+        return time.localtime(self.epoch)
+
+    def _memoize(self):
+        """Build the day-dependent strings if they were built on another day."""
+        today = _current_day()
+        if self._memo_day == today.start:
+            return
+
+        sent_date = time.localtime(self.epoch)
+        message_date = date(sent_date.tm_year, sent_date.tm_mon, sent_date.tm_mday)
+
+        if message_date == today.date:
+            self._display = self._speech = "Today"
+        elif today.date.year == message_date.year:
+            if today.iso_week == message_date.isocalendar()[1] and today.weekday >= message_date.weekday():
+                self._display = time.strftime("%a", sent_date)
+                self._speech = time.strftime("%A", sent_date)  # Full weekday name
+            else:
+                self._display = time.strftime("%b %d", sent_date)
+                self._speech = time.strftime("%B %d", sent_date)  # Full month name
+        else:
+            self._display = time.strftime("%b %d, %Y", sent_date)
+            self._speech = time.strftime("%B %d, %Y", sent_date)
+
+        self._memo_day = today.start
 
     def get_sender_name(self):
         """Extract just the sender's name from the full sender string."""
@@ -21,33 +97,13 @@ class Message:
 
     def get_date_for_display(self):
         """Get a short date string for display in message list (e.g., 'Today', 'Mon', 'Jan 15')."""
-        now = datetime.now()
-        message_date = datetime.fromtimestamp(time.mktime(self.sent_date))
-
-        if message_date.date() == now.date():
-            return "Today"
-        elif now.year == message_date.year:
-            if now.isocalendar()[1] == message_date.isocalendar()[1] and now.weekday() >= message_date.weekday():
-                return time.strftime("%a", self.sent_date)
-            else:
-                return time.strftime("%b %d", self.sent_date)
-        else:
-            return time.strftime("%b %d, %Y", self.sent_date)
+        self._memoize()
+        return self._display
 
     def get_date_for_speech(self):
         """Get a full date string suitable for text-to-speech (e.g., 'Today', 'Monday', 'January 15')."""
-        now = datetime.now()
-        message_date = datetime.fromtimestamp(time.mktime(self.sent_date))
-
-        if message_date.date() == now.date():
-            return "Today"
-        elif now.year == message_date.year:
-            if now.isocalendar()[1] == message_date.isocalendar()[1] and now.weekday() >= message_date.weekday():
-                return time.strftime("%A", self.sent_date)  # Full weekday name
-            else:
-                return time.strftime("%B %d", self.sent_date)  # Full month name
-        else:
-            return time.strftime("%B %d, %Y", self.sent_date)
+        self._memoize()
+        return self._speech
 
     def get_date_full(self):
         """Get full date and time for message detail view."""
@@ -0,0 +1,166 @@
+"""
+Attachment saving.
+
+AttachmentStore is a content-addressed directory: every saved attachment is
+kept once under objects/<sha256>, and an index maps (message id, part) to
+its hash so saving the same attachment again never downloads it.
+
+AttachmentSaver downloads attachments on a background thread and decodes
+them to disk a chunk at a time, so a large attachment is never held in
+memory in decoded form. The UI polls status() to show progress.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from gmail_interface import getAttachmentData
+
+DEFAULT_STORE_DIR = 'attachments'
+DEFAULT_SAVE_DIR = os.path.expanduser('~/Downloads')
+
+# Base64 characters decoded and written per step (a multiple of 4)
+WRITE_CHUNK_SIZE = 256 * 1024
+
+
+class AttachmentStore:
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self._root = root
+        self._objects = os.path.join(root, 'objects')
+        self._index_path = os.path.join(root, 'index.json')
+        self._lock = threading.Lock()
+        os.makedirs(self._objects, exist_ok=True)
+        self._index = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as index_file:
+                self._index = json.load(index_file)
+
+    @staticmethod
+    def _key(message_id, attachment):
+        return f"{message_id}/{attachment.get('part_id') or attachment['filename']}"
+
+    def lookup(self, message_id, attachment):
+        """Return the stored path of an attachment, or None if it was never saved."""
+        with self._lock:
+            digest = self._index.get(self._key(message_id, attachment))
+        if digest is None:
+            return None
+        path = os.path.join(self._objects, digest)
+        return path if os.path.exists(path) else None
+
+    def temp_file(self):
+        """Open a temporary file on the same filesystem as the store, for add()."""
+        return tempfile.NamedTemporaryFile(dir=self._root, delete=False)
+
+    def add(self, message_id, attachment, temp_path, digest):
+        """Move a downloaded file into the store under its hash and return its path.
+
+        If the same content is already stored the download is dropped.
+        """
+        path = os.path.join(self._objects, digest)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+
+        with self._lock:
+            self._index[self._key(message_id, attachment)] = digest
+            with open(self._index_path, 'w') as index_file:
+                json.dump(self._index, index_file)
+        return path
+
+
+def _unique_path(directory, filename):
+    """Return a path in directory for filename that does not overwrite anything."""
+    name, extension = os.path.splitext(os.path.basename(filename) or 'attachment')
+    path = os.path.join(directory, name + extension)
+    copy = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f'{name} ({copy}){extension}')
+        copy += 1
+    return path
+
+
+class AttachmentSaver:
+    def __init__(self, service, store=None, save_dir=DEFAULT_SAVE_DIR):
+        self._service = service
+        self._store = store if store is not None else AttachmentStore()
+        self.save_dir = save_dir
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='attachments')
+
+        # Progress of the current or last save, read by the UI
+        self._lock = threading.Lock()
+        self._status = None
+        self._active = 0
+
+    def save(self, message_id, attachment):
+        """Queue an attachment to be saved to save_dir. Returns a Future of the saved path."""
+        with self._lock:
+            self._active += 1
+            self._status = f"Queued {attachment['filename']}"
+        return self._pool.submit(self._save, message_id, attachment)
+
+    def is_active(self):
+        with self._lock:
+            return self._active > 0
+
+    def status(self):
+        """Return a one line description of the current or last save, or None."""
+        with self._lock:
+            return self._status
+
+    def _set_status(self, status):
+        with self._lock:
+            self._status = status
+
+    def _save(self, message_id, attachment):
+        filename = attachment['filename']
+        try:
+            stored = self._store.lookup(message_id, attachment)
+            if stored is None:
+                stored = self._download(message_id, attachment)
+
+            os.makedirs(self.save_dir, exist_ok=True)
+            path = _unique_path(self.save_dir, filename)
+            # Copy rather than link, so editing the saved file can't change the stored content
+            shutil.copyfile(stored, path)
+            self._set_status(f'Saved {filename} to {path}')
+            return path
+        except Exception as error:
+            self._set_status(f'Failed to save {filename}: {error}')
+            print(f'Failed to save attachment {filename}: {error}', file=sys.stderr)
+            raise
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _download(self, message_id, attachment):
+        filename = attachment['filename']
+        self._set_status(f'Downloading {filename}')
+        data = getAttachmentData(self._service, message_id, attachment)
+
+        digest = hashlib.sha256()
+        temp = self._store.temp_file()
+        try:
+            with temp:
+                for start in range(0, len(data), WRITE_CHUNK_SIZE):
+                    chunk = data[start:start + WRITE_CHUNK_SIZE]
+                    decoded = base64.urlsafe_b64decode(chunk + '=' * (-len(chunk) % 4))
+                    digest.update(decoded)
+                    temp.write(decoded)
+                    percent = min(100, (start + len(chunk)) * 100 // len(data))
+                    self._set_status(f'Saving {filename} {percent}%')
+        except Exception:
+            os.remove(temp.name)
+            raise
+        del data
+        return self._store.add(message_id, attachment, temp.name, digest.hexdigest())
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,123 @@
+"""
+AudioCache - spoken summaries rendered to audio files, kept on disk.
+
+Clips are keyed by a hash of (text, rate, voice), so a clip is only reused
+when it would sound exactly like live speech. The directory is bounded by
+total size; the least recently played clips are deleted first.
+
+Clips are played with whichever command line player the system has
+(see PLAYERS). Without one the cache can't be used and speech stays live.
+"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+
+DEFAULT_CACHE_DIR = 'speech_cache'
+
+# Total size of the cached clips before old ones are deleted
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+# Players tried in order, with the arguments that come before the file name
+PLAYERS = [
+    ['afplay'],
+    ['paplay'],
+    ['aplay', '-q'],
+    ['ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet'],
+]
+
+
+def find_player():
+    """Return the command to play a clip with, or None if no player is installed."""
+    for command in PLAYERS:
+        if shutil.which(command[0]):
+            return command
+    return None
+
+
+class AudioCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, player=None):
+        self._root = root
+        self._max_bytes = max_bytes
+        self.player = player if player is not None else find_player()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+        # Clip name -> size, oldest use first
+        self._sizes = {}
+        clips = [entry for entry in os.scandir(root) if entry.name.endswith('.wav')]
+        for entry in sorted(clips, key=lambda entry: entry.stat().st_mtime):
+            self._sizes[entry.name] = entry.stat().st_size
+        self._total = sum(self._sizes.values())
+
+    def is_usable(self):
+        return self.player is not None
+
+    @staticmethod
+    def _name(text, rate, voice):
+        key = f'{rate}\0{voice}\0{text}'.encode('utf-8', 'surrogatepass')
+        return hashlib.sha256(key).hexdigest() + '.wav'
+
+    def lookup(self, text, rate, voice):
+        """Return the path of the clip for text, or None if it isn't rendered yet."""
+        name = self._name(text, rate, voice)
+        with self._lock:
+            if name not in self._sizes:
+                return None
+            # Most recently used last, and on disk for the next run
+            self._sizes[name] = self._sizes.pop(name)
+        path = os.path.join(self._root, name)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._forget(name)
+            return None
+        return path
+
+    def render_path(self, text, rate, voice):
+        """Return the temporary path to render the clip for text to; pass it to add() when done."""
+        return os.path.join(self._root, self._name(text, rate, voice) + '.part')
+
+    def add(self, temp_path):
+        """Move a rendered clip into the cache, then delete old clips beyond max_bytes."""
+        path = temp_path[:-len('.part')]
+        name = os.path.basename(path)
+        try:
+            size = os.path.getsize(temp_path)
+        except OSError:
+            # The engine gave up without writing anything
+            return
+        if not size:
+            os.remove(temp_path)
+            return
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._forget(name)
+            self._sizes[name] = size
+            self._total += size
+            while self._total > self._max_bytes and len(self._sizes) > 1:
+                oldest = next(iter(self._sizes))
+                self._forget(oldest)
+                try:
+                    os.remove(os.path.join(self._root, oldest))
+                except OSError:
+                    pass
+
+    def discard(self, temp_path):
+        """Delete a clip whose rendering was cut short."""
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+    def _forget(self, name):
+        self._total -= self._sizes.pop(name, 0)
+
+    def play(self, path):
+        """Start playing a clip. Returns the player process; it can be terminated to stop."""
+        return subprocess.Popen(self.player + [path], stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
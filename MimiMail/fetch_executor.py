@@ -0,0 +1,236 @@
+"""
+FetchExecutor - runs Gmail API calls on a bounded thread pool.
+
+Calls that fail with 429 or 5xx errors are retried with exponential backoff
+and jitter. The number of calls in flight adapts to throttling (additive
+increase, multiplicative decrease), and a token bucket keeps the spend under
+Gmail's per-user quota. Latency and retry counts are recorded so the pool
+can be tuned.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.errors import HttpError
+
+import metrics
+
+# Gmail allows 250 quota units per user per second
+QUOTA_UNITS_PER_SECOND = 250
+
+# Quota units charged per call, from the Gmail API usage limits
+QUOTA_COSTS = {
+    'messages.get': 5,
+    'messages.list': 5,
+    'messages.attachments.get': 5,
+    'messages.batchModify': 50,
+    'threads.get': 10,
+    'threads.list': 10,
+    'history.list': 2,
+    'labels.get': 1,
+    'labels.list': 1,
+    'getProfile': 1,
+}
+
+RETRYABLE_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+_thread_local = threading.local()
+
+
+def _thread_http(http):
+    """Return an Http object the calling thread may use for API requests.
+
+    httplib2 connections are not thread safe, so each thread that talks to the
+    API gets its own authorized Http built from the service's credentials.
+    """
+    credentials = getattr(http, 'credentials', None)
+    if credentials is None:
+        return http
+
+    per_thread = getattr(_thread_local, 'http', None)
+    if per_thread is None:
+        per_thread = _thread_local.http = {}
+    if id(credentials) not in per_thread:
+        # Imported here so that importing this module stays cheap at startup
+        from googleapiclient.http import build_http
+        from google_auth_httplib2 import AuthorizedHttp
+
+        per_thread[id(credentials)] = AuthorizedHttp(credentials, http=build_http())
+    return per_thread[id(credentials)]
+
+
+def execute_request(request, http=None):
+    """Execute an API request or batch on the calling thread's Http.
+
+    Batches take their Http from a request they contain, so pass it in.
+    """
+    if http is None:
+        http = getattr(request, 'http', None)
+    if not metrics.enabled:
+        return request.execute(http=_thread_http(http))
+
+    # 'gmail.users.messages.get' is recorded as api.messages.get; batches have no methodId
+    name = 'api.' + getattr(request, 'methodId', 'batch').replace('gmail.users.', '')
+    start = time.perf_counter()
+    try:
+        return request.execute(http=_thread_http(http))
+    except HttpError as error:
+        metrics.count(f'{name}.errors.{error.resp.status}')
+        raise
+    finally:
+        metrics.observe(name, time.perf_counter() - start)
+
+
+def is_retryable(error):
+    """Check whether an HttpError is throttling or a server-side failure."""
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status == 429 or status >= 500:
+        return True
+    if status == 403:
+        content = error.content.decode('utf-8', 'replace') if isinstance(error.content, bytes) else str(error.content)
+        return any(reason in content for reason in RETRYABLE_REASONS)
+    return False
+
+
+class _QuotaBucket:
+    """Token bucket refilled at the per-user quota rate."""
+
+    def __init__(self, units_per_second):
+        self._rate = units_per_second
+        self._tokens = units_per_second
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, units):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._rate, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                # A call costing more than a full bucket goes through once the bucket is full
+                if self._tokens >= min(units, self._rate):
+                    self._tokens -= units
+                    return
+                wait = (min(units, self._rate) - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+class _AdaptiveLimit:
+    """Concurrency limit that grows by one per window of successes and halves on throttling."""
+
+    def __init__(self, initial, maximum):
+        self.limit = initial
+        self._maximum = maximum
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, throttled):
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self._maximum:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+class FetchExecutor:
+    def __init__(self, max_workers=8, initial_concurrency=4, quota_per_second=QUOTA_UNITS_PER_SECOND,
+                 max_retries=5, base_delay=0.5, max_delay=32.0):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gmail-fetch')
+        self._limit = _AdaptiveLimit(min(initial_concurrency, max_workers), max_workers)
+        self._quota = _QuotaBucket(quota_per_second)
+        self._max_retries = max_retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+
+        self._stats_lock = threading.Lock()
+        # Recent per-call latencies in seconds
+        self._latencies = deque(maxlen=10000)
+        self._retries = 0
+        self._failures = 0
+        self._calls = 0
+
+    def submit(self, call, cost=QUOTA_COSTS['messages.get']):
+        """Run call() on the pool, retrying it on retryable HttpErrors.
+
+        call must be safe to run again after a failure: build the request
+        inside it. cost is the number of quota units one attempt spends, or a
+        function returning it when that changes between attempts.
+        Returns a Future for call's result.
+        """
+        return self._pool.submit(self._run, call, cost)
+
+    def run(self, call, cost=QUOTA_COSTS['messages.get']):
+        """Like submit() but waits for and returns the result."""
+        return self.submit(call, cost).result()
+
+    def _run(self, call, cost):
+        attempt = 0
+        while True:
+            self._quota.acquire(cost() if callable(cost) else cost)
+            self._limit.acquire()
+            start = time.perf_counter()
+            throttled = False
+            try:
+                return call()
+            except HttpError as error:
+                throttled = is_retryable(error)
+                if not throttled or attempt >= self._max_retries:
+                    with self._stats_lock:
+                        self._failures += 1
+                    raise
+            finally:
+                elapsed = time.perf_counter() - start
+                self._limit.release(throttled)
+                with self._stats_lock:
+                    self._calls += 1
+                    self._latencies.append(elapsed)
+
+            with self._stats_lock:
+                self._retries += 1
+            metrics.count('api.retries')
+            delay = min(self._max_delay, self._base_delay * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            attempt += 1
+
+    def stats(self):
+        """Return call counts, retries, failures, latency percentiles and the current limit."""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                'calls': self._calls,
+                'retries': self._retries,
+                'failures': self._failures,
+                'concurrency': self._limit.limit,
+            }
+        if latencies:
+            stats['latency_mean'] = sum(latencies) / len(latencies)
+            stats['latency_p50'] = latencies[len(latencies) // 2]
+            stats['latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats['latency_max'] = latencies[-1]
+        return stats
+
+    def report(self):
+        """Format stats() as a single line for logs."""
+        return ' '.join(f'{key}={value:.3f}' if isinstance(value, float) else f'{key}={value}'
+                        for key, value in self.stats().items())
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -6,32 +6,96 @@ https://developers.google.com/gmail/api/quickstart/python
 import os.path
 import base64
 import codecs
+import email.message
+import email.parser
+import email.policy
+import json
 import re
+import sys
+import threading
+import time
 
-import pyttsx3
-
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+import metrics
 from Message import Message
+from Conversation import Conversation
+from fetch_executor import FetchExecutor, QUOTA_COSTS, execute_request, is_retryable
+from lru_cache import LRUCache
+from html_text import html_to_text
+
+# gmail.modify is needed by markRead() and replayChanges(). If modifying these
+# scopes, delete the file token.json.
+SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
+
+# Discovery document of the Gmail API, saved by buildService() so later starts need no network
+DISCOVERY_CACHE_PATH = 'gmail_discovery.json'
+
+# Seconds after a failed connection before DeferredService tries again
+RECONNECT_INTERVAL = 30
 
-# If modifying these scopes, delete the file token.json.
-SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+# Most ids messages().batchModify() accepts at once
+BATCH_MODIFY_SIZE = 1000
 
-engine = pyttsx3.init()
-# This is the speaking rate defaults to 200 words per minute
-engine.setProperty('rate', 130)
+# Text to speech engine used by getEmail(); started on first use
+_engine = None
 
 URL_PATTERN = r'[A-Za-z0-9]+://[A-Za-z0-9%-_]+(/[A-Za-z0-9%-_])*(#|\\?)[A-Za-z0-9%-_&=]*'
+_URL_RE = re.compile(URL_PATTERN)
+
+# Number of texts whose URL spans are remembered
+URL_SPAN_CACHE_SIZE = 32
+
+# Gmail accepts up to 100 calls per batch request but recommends 50 or fewer
+DEFAULT_BATCH_SIZE = 50
+
+# Headers needed to draw a row in the message list
+LIST_HEADERS = ['From', 'Subject', 'Date']
+
+# How bodies are fetched: 'full' walks the JSON payload, 'raw' parses the
+# RFC 822 message with the stdlib email parser
+BODY_FORMAT = 'full'
+
+# Base64 characters decoded per step when parsing format=raw (a multiple of 4)
+RAW_CHUNK_SIZE = 64 * 1024
+
+# Number of decoded bodies kept in memory
+BODY_CACHE_SIZE = 100
+
+# Gmail matches asked for when searching beyond the local store
+REMOTE_SEARCH_LIMIT = 50
+
+_executor = None
+
+# Decoded bodies by message id, shared by every LazyBody
+body_cache = LRUCache(BODY_CACHE_SIZE)
+
+# [lock, users] of the bodies being loaded, by message id, so that every
+# LazyBody of a message shares one fetch
+_body_loads = {}
+_body_loads_lock = threading.Lock()
+
+# URL spans by text, see url_spans()
+_url_span_cache = LRUCache(URL_SPAN_CACHE_SIZE)
 
 headers = ['Subject', 'From', 'Date', 'body',
            'parts']
 
 
+def url_spans(text: str) -> tuple:
+    """ Return the (start, end) spans of all the URLs in a text.
+    Spans are computed once per text and cached, so the screen and speech
+    variants of the same body share one scan.
+    """
+    spans = _url_span_cache.get(text)
+    if spans is None:
+        spans = tuple(match.span() for match in _URL_RE.finditer(text))
+        _url_span_cache.put(text, spans)
+    return spans
+
+
 # from: https://github.com/jmgomezsoriano/mysmallutils
+@metrics.timed('urls.replace')
 def replace_urls(text: str, replace: str, end_with: str = '') -> str:
     """ Replace all the URLs with path by a text.
     :param text: The text to replace.
@@ -40,97 +104,830 @@ def replace_urls(text: str, replace: str, end_with: str = '') -> str:
          By default, replace all the URLs.
     :return: The replaced text.
     """
-    matches = list(re.finditer(URL_PATTERN + end_with, text))
-    matches.reverse()
-    for match in matches:
-        start, end = match.span()[0], match.span()[1]
-        text = text[:start] + replace + text[end:]
-    return text
+    if end_with:
+        spans = [match.span() for match in re.finditer(URL_PATTERN + end_with, text)]
+    else:
+        spans = url_spans(text)
+    if not spans:
+        return text
 
+    # Build the result in one pass instead of re-slicing the text per URL
+    pieces = []
+    last = 0
+    for start, end in spans:
+        pieces.append(text[last:start])
+        pieces.append(replace)
+        last = end
+    pieces.append(text[last:])
+    return ''.join(pieces)
 
-from bs4 import BeautifulSoup
 
 def _find_body_parts(payload):
-    """Recursively search for text/plain and text/html body parts in the email payload."""
-    plain_text_body = None
-    html_body = None
+    """Recursively search for text/plain and text/html body parts in the email payload.
+
+    Returns the part dicts, so callers can read each part's headers as well
+    as its body. Attachments are skipped.
+    """
+    plain_text_part = None
+    html_part = None
 
     if 'parts' in payload:
         for part in payload['parts']:
             mime_type = part.get('mimeType', '')
+            if part.get('filename'):
+                continue
 
             if mime_type == 'text/plain':
-                plain_text_body = part['body']
+                plain_text_part = part
             elif mime_type == 'text/html':
-                html_body = part['body']
+                html_part = part
             elif mime_type.startswith('multipart/'):
                 # Recursively search nested multipart structures
                 nested_plain, nested_html = _find_body_parts(part)
-                if nested_plain and not plain_text_body:
-                    plain_text_body = nested_plain
-                if nested_html and not html_body:
-                    html_body = nested_html
+                if nested_plain and not plain_text_part:
+                    plain_text_part = nested_plain
+                if nested_html and not html_part:
+                    html_part = nested_html
     else:
         # No parts, check the payload directly
         mime_type = payload.get('mimeType', '')
         if mime_type == 'text/plain':
-            plain_text_body = payload.get('body')
+            plain_text_part = payload
         elif mime_type == 'text/html':
-            html_body = payload.get('body')
+            html_part = payload
 
-    return plain_text_body, html_body
+    return plain_text_part, html_part
 
-def getUnreadEmails(service):
-    messages = []
-    results = service.users().messages().list(userId='me', labelIds=['INBOX']).execute()
-    if not results.get('messages'):
-        return messages
 
-    for r in results.get('messages'):
-        message = service.users().messages().get(userId='me', id=r['id']).execute()
-        payload = message.get('payload')
-        headers = payload.get('headers')
-
-        sender = None
-        sent_date = None
-        subject = None
-        body = None
-        for x in headers:
-            name = x['name']
-            value = x['value']
-            if name == 'From':
-                sender = value
-            if name == 'Date':
-                sent_date = value
-            if name == 'Subject':
-                subject = value
-
-        plain_text_body, html_body = _find_body_parts(payload)
-
-        body_data = None
-        if plain_text_body and 'data' in plain_text_body:
-            body_data = plain_text_body['data']
-        elif html_body and 'data' in html_body:
-            body_data = html_body['data']
-
-        if body_data:
-            data = body_data.replace('-', '+').replace('_', '/')
-            decoded_data = base64.b64decode(data)
-            if html_body and not plain_text_body:
-                soup = BeautifulSoup(decoded_data, 'html.parser')
-                body = {'data': soup.get_text()}
+def _part_charset(part):
+    """Return the charset declared in a payload part's Content-Type, defaulting to UTF-8."""
+    for header in part.get('headers', []):
+        if header['name'].lower() == 'content-type':
+            content_type = email.message.Message()
+            content_type['Content-Type'] = header['value']
+            return content_type.get_content_charset('utf-8')
+    return 'utf-8'
+
+
+def _decode_text(data, charset):
+    try:
+        return data.decode(charset, 'replace')
+    except LookupError:
+        return data.decode('utf-8', 'replace')
+
+
+def _iter_parts(payload):
+    """Yield every part of a format=full payload, depth first, starting with the payload itself."""
+    yield payload
+    for part in payload.get('parts', []):
+        yield from _iter_parts(part)
+
+
+def _find_attachments(payload):
+    """Return a metadata dict for each attachment in a format=full payload."""
+    attachments = []
+    for part in _iter_parts(payload):
+        if part.get('filename'):
+            body = part.get('body', {})
+            attachments.append({'filename': part['filename'], 'mime_type': part.get('mimeType', ''),
+                                'size': body.get('size', 0), 'part_id': part.get('partId'),
+                                'attachment_id': body.get('attachmentId')})
+    return attachments
+
+
+@metrics.timed('mime.decode')
+def _decode_body(payload):
+    """Decode the preferred text body of a format=full payload into a body dict.
+
+    The dict also lists the message's attachments, if it has any.
+    """
+    plain_text_part, html_part = _find_body_parts(payload)
+
+    part = None
+    if plain_text_part and 'data' in plain_text_part.get('body', {}):
+        part = plain_text_part
+    elif html_part and 'data' in html_part.get('body', {}):
+        part = html_part
+
+    body = {}
+    if part is not None:
+        text = _decode_text(base64.urlsafe_b64decode(part['body']['data']), _part_charset(part))
+        body['data'] = html_to_text(text) if part is html_part else text
+
+    attachments = _find_attachments(payload)
+    if attachments:
+        body['attachments'] = attachments
+    return body
+
+
+@metrics.timed('mime.parse_raw')
+def _parse_raw(raw):
+    """Parse a format=raw message into an email.message.EmailMessage.
+
+    The base64url text is decoded and fed to the parser a chunk at a time,
+    so the full decoded message is never held alongside the encoded one.
+    """
+    parser = email.parser.BytesFeedParser(policy=email.policy.default)
+    for start in range(0, len(raw), RAW_CHUNK_SIZE):
+        chunk = raw[start:start + RAW_CHUNK_SIZE]
+        # Gmail may leave the padding off the final chunk
+        parser.feed(base64.urlsafe_b64decode(chunk + '=' * (-len(chunk) % 4)))
+    return parser.close()
+
+
+@metrics.timed('mime.decode_raw')
+def _decode_part(part):
+    """Decode a text part of a parsed message, falling back to UTF-8 for unknown charsets."""
+    return _decode_text(part.get_payload(decode=True) or b'', part.get_content_charset('utf-8'))
+
+
+def _body_from_email(message):
+    """Decode the preferred text body of a parsed message into a body dict.
+
+    Each part is decoded with its own declared charset. Attachments are
+    listed but their payloads are never decoded.
+    """
+    plain_text_part = None
+    html_part = None
+    attachments = []
+    for part in message.walk():
+        if part.is_multipart():
+            continue
+        if part.is_attachment():
+            # Only the size of the encoded payload is looked at, never its content
+            attachments.append({'filename': part.get_filename(), 'mime_type': part.get_content_type(),
+                                'size': len(part.get_payload()) * 3 // 4, 'part_id': None,
+                                'attachment_id': None})
+            continue
+        content_type = part.get_content_type()
+        if content_type == 'text/plain' and plain_text_part is None:
+            plain_text_part = part
+        elif content_type == 'text/html' and html_part is None:
+            html_part = part
+
+    body = {}
+    if plain_text_part is not None:
+        body['data'] = _decode_part(plain_text_part)
+    elif html_part is not None:
+        body['data'] = html_to_text(_decode_part(html_part))
+    if attachments:
+        body['attachments'] = attachments
+    return body
+
+
+def _attachments_from_email(message):
+    """Return (filename, content type, decoded bytes) for each attachment of a parsed message."""
+    return [(part.get_filename(), part.get_content_type(), part.get_payload(decode=True))
+            for part in message.iter_attachments()]
+
+
+class LazyBody:
+    """Message body that is only fetched and decoded when it is read.
+
+    Behaves like the body dict it replaces, so Message.get_body_text() works
+    unchanged. Decoded bodies are kept in the shared body_cache rather than on
+    the message, so memory stays bounded however many messages are opened.
+    Safe to read from several threads; concurrent reads of the same message
+    share one fetch, even through different LazyBody instances.
+    With a store, a previously fetched body is read from disk instead, and a
+    newly fetched one is saved there.
+    """
+
+    def __init__(self, service, message_id, store=None, body_format=None):
+        self._service = service
+        self._message_id = message_id
+        self._store = store
+        self._body_format = body_format or BODY_FORMAT
+
+    def is_loaded(self):
+        return self._message_id in body_cache
+
+    def load(self):
+        """Fetch and decode the body if needed, and return it as a dict."""
+        body = body_cache.get(self._message_id)
+        if body is not None:
+            return body
+
+        with _body_loads_lock:
+            load = _body_loads.get(self._message_id)
+            if load is None:
+                load = _body_loads[self._message_id] = [threading.Lock(), 0]
+            load[1] += 1
+        try:
+            with load[0]:
+                body = body_cache.get(self._message_id)
+                if body is None and self._store is not None:
+                    body = self._store.get_body(self._message_id)
+                if body is None:
+                    request = self._service.users().messages().get(userId='me', id=self._message_id,
+                                                                   format=self._body_format)
+                    message = get_executor().run(lambda: execute_request(request), QUOTA_COSTS['messages.get'])
+                    body = _body_from_resource(message, self._body_format)
+                    if self._store is not None:
+                        self._store.put_body(self._message_id, body)
+                body_cache.put(self._message_id, body)
+        finally:
+            with _body_loads_lock:
+                load[1] -= 1
+                if not load[1]:
+                    del _body_loads[self._message_id]
+        return body
+
+    def get(self, key, default=None):
+        return self.load().get(key, default)
+
+
+def _body_from_resource(message, body_format):
+    """Decode the body of a users.messages resource fetched with body_format."""
+    if body_format == 'raw':
+        return _body_from_email(_parse_raw(message.get('raw', '')))
+    return _decode_body(message.get('payload', {}))
+
+
+def _message_from_json(message, body=None):
+    """Build a Message from a users.messages resource.
+
+    If body is not given the resource must have been fetched with format=full
+    and the body is decoded from its payload.
+    """
+    payload = message.get('payload')
+    headers = payload.get('headers')
+
+    sender = None
+    sent_date = None
+    subject = None
+    for x in headers:
+        name = x['name']
+        value = x['value']
+        if name == 'From':
+            sender = value
+        if name == 'Date':
+            sent_date = value
+        if name == 'Subject':
+            subject = value
+
+    if body is None:
+        body = _decode_body(payload)
+
+    return Message(sender, sent_date, subject, body, message.get('id'))
+
+
+def get_executor():
+    """Return the FetchExecutor shared by all API calls in this module."""
+    global _executor
+    if _executor is None:
+        _executor = FetchExecutor()
+    return _executor
+
+
+def _fetch_chunk(service, message_ids, get_kwargs, resource='messages'):
+    """Fetch message (or thread) resources in one batch request.
+
+    Returns a call and its quota cost for FetchExecutor, and the list the
+    call fills in. Each attempt
+    only requests the ids that have not succeeded yet, and raises the first
+    retryable per-item error so the executor backs off before the next
+    attempt. Items that fail for good are reported and left as None.
+    """
+    results = [None] * len(message_ids)
+    pending = set(range(len(message_ids)))
+
+    def call():
+        retry_error = None
+
+        def callback(request_id, response, exception):
+            nonlocal retry_error
+            index = int(request_id)
+            if exception is None:
+                results[index] = response
             else:
-                body = {'data': decoded_data.decode('utf-8')}
+                metrics.count(f'api.batch.{resource}.get.errors.{exception.resp.status}')
+                if is_retryable(exception):
+                    retry_error = retry_error or exception
+                    return
+                print(f'Failed to fetch {resource} {message_ids[index]}: {exception}', file=sys.stderr)
+            pending.discard(index)
+
+        batch = service.new_batch_http_request(callback=callback)
+        metrics.count(f'api.batch.{resource}.get', len(pending))
+        for index in sorted(pending):
+            request = getattr(service.users(), resource)().get(userId='me', id=message_ids[index], **get_kwargs)
+            batch.add(request, request_id=str(index))
+        execute_request(batch, http=getattr(request, 'http', None))
 
+        if retry_error is not None:
+            raise retry_error
+        return results
 
-        mess = Message(sender, sent_date, subject, body if body else {})
+    def cost():
+        return QUOTA_COSTS[f'{resource}.get'] * len(pending)
 
+    return call, cost, results
 
-        messages.append(mess)
 
+def _iter_batched(service, resource, ids, batch_size=DEFAULT_BATCH_SIZE, **get_kwargs):
+    """Fetch 'messages' or 'threads' resources using batched HTTP requests.
+
+    Batches run in parallel on the shared executor. Yields one entry per id,
+    in the same order as ids, as soon as the batch containing it completes.
+    Entries for resources that failed to fetch are None.
+    """
+    executor = get_executor()
+    futures = []
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        call, cost, results = _fetch_chunk(service, chunk, get_kwargs, resource)
+        futures.append((results, executor.submit(call, cost)))
+
+    for results, future in futures:
+        try:
+            future.result()
+        except HttpError as error:
+            print(f'Failed to fetch {results.count(None)} {resource}: {error}', file=sys.stderr)
+        yield from results
+
+
+def _iter_messages_batched(service, message_ids, batch_size=DEFAULT_BATCH_SIZE, **get_kwargs):
+    """Fetch message resources using batched HTTP requests; see _iter_batched()."""
+    return _iter_batched(service, 'messages', message_ids, batch_size, **get_kwargs)
+
+
+def _iter_ids(service, resource, **list_kwargs):
+    """Yield pages of ids from messages().list() or threads().list(), following nextPageToken."""
+    page_token = None
+    while True:
+        request = getattr(service.users(), resource)().list(userId='me', pageToken=page_token, **list_kwargs)
+        results = get_executor().run(lambda: execute_request(request), QUOTA_COSTS[f'{resource}.list'])
+        ids = [r['id'] for r in results.get(resource, [])]
+        if ids:
+            yield ids
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+
+def _iter_message_ids(service, **list_kwargs):
+    """Yield pages of message ids from messages().list(), following nextPageToken."""
+    return _iter_ids(service, 'messages', **list_kwargs)
+
+
+def _get_header(message, name):
+    for header in message.get('payload', {}).get('headers', []):
+        if header['name'] == name:
+            return header['value']
+    return None
+
+
+def _header_row(message):
+    """Return the list headers and labels of a metadata format message as a MessageStore.put_headers_many() row."""
+    return (message['id'], message.get('threadId'),
+            _get_header(message, 'From'), _get_header(message, 'Date'),
+            _get_header(message, 'Subject'), message.get('internalDate'),
+            message.get('labelIds', []))
+
+
+def _store_headers(service, store, message_ids, batch_size=DEFAULT_BATCH_SIZE):
+    """Fetch list headers and labels for message_ids into the store, one transaction per batch."""
+    rows = []
+    for message in _iter_messages_batched(service, message_ids, batch_size,
+                                          format='metadata', metadataHeaders=LIST_HEADERS):
+        if message is not None:
+            rows.append(_header_row(message))
+        if len(rows) >= batch_size:
+            store.put_headers_many(rows)
+            rows = []
+    store.put_headers_many(rows)
+
+
+def _full_sync(service, store, label_id, batch_size=DEFAULT_BATCH_SIZE):
+    """Refresh headers and labels of every message in label_id.
+
+    Bodies already in the store are kept. The historyId is read before
+    listing so that nothing that changes during the sync is missed next time.
+    """
+    request = service.users().getProfile(userId='me')
+    history_id = get_executor().run(lambda: execute_request(request), QUOTA_COSTS['getProfile'])['historyId']
+
+    listed = set()
+    for message_ids in _iter_message_ids(service, labelIds=[label_id]):
+        listed.update(message_ids)
+        _store_headers(service, store, message_ids, batch_size)
+
+    store.remove_label(store.ids_with_label(label_id) - listed, label_id)
+    store.set_history_id(history_id, label_id)
+
+
+def _sync_history(service, store, label_id, start_history_id, batch_size=DEFAULT_BATCH_SIZE):
+    """Apply the changes recorded since start_history_id to the store."""
+    added = set()
+    deleted = set()
+    history_id = start_history_id
+    page_token = None
+    while True:
+        request = service.users().history().list(userId='me', startHistoryId=start_history_id,
+                                                 pageToken=page_token)
+        results = get_executor().run(lambda: execute_request(request), QUOTA_COSTS['history.list'])
+        history_id = results.get('historyId', history_id)
+
+        for record in results.get('history', []):
+            for change in record.get('messagesAdded', []):
+                message = change['message']
+                if label_id in message.get('labelIds', []):
+                    added.add(message['id'])
+            for change in record.get('messagesDeleted', []):
+                deleted.add(change['message']['id'])
+            for change in record.get('labelsAdded', []) + record.get('labelsRemoved', []):
+                message = change['message']
+                if store.contains(message['id']):
+                    store.set_labels(message['id'], message.get('labelIds', []))
+                elif label_id in message.get('labelIds', []):
+                    added.add(message['id'])
+
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+    store.delete(deleted)
+    _store_headers(service, store, sorted(added - deleted), batch_size)
+    store.set_history_id(history_id, label_id)
+
+
+def syncStore(service, store, label_id='INBOX', batch_size=DEFAULT_BATCH_SIZE):
+    """Bring the store up to date with the mailbox.
+
+    Only the changes since the last sync are fetched. A full sync is done on
+    the first run and whenever Gmail no longer has history that far back.
+    """
+    history_id = store.get_history_id(label_id)
+    if history_id is not None:
+        try:
+            _sync_history(service, store, label_id, history_id, batch_size)
+            return
+        except HttpError as error:
+            # Gmail answers 404 once the startHistoryId is too old
+            if error.resp.status != 404:
+                raise
+    _full_sync(service, store, label_id, batch_size)
+
+
+def iterEmails(service, label_ids=('INBOX',), q=None, batch_size=DEFAULT_BATCH_SIZE, store=None):
+    """Yield Messages carrying all of label_ids and matching the Gmail query q, newest first.
+
+    The labels and query are passed to messages().list(), so Gmail does the
+    filtering. Only the headers the message list needs are fetched up front;
+    each body is fetched and decoded the first time it is read.
+
+    With a store, a single label without a query is synced and then read
+    from the store. Otherwise headers already in the store are reused and
+    the rest are fetched and added to it.
+    """
+    label_ids = list(label_ids or [])
+    if store is not None and q is None and len(label_ids) == 1:
+        syncStore(service, store, label_ids[0], batch_size)
+        for message_id, sender, sent_date, subject in store.list_headers(label_ids[0]):
+            yield Message(sender, sent_date, subject, LazyBody(service, message_id, store), message_id)
+        return
+
+    list_kwargs = {}
+    if label_ids:
+        list_kwargs['labelIds'] = label_ids
+    if q:
+        list_kwargs['q'] = q
+
+    for message_ids in _iter_message_ids(service, **list_kwargs):
+        stored = store.get_headers(message_ids) if store is not None else {}
+        missing = [message_id for message_id in message_ids if message_id not in stored]
+        fetched = {}
+        for message in _iter_messages_batched(service, missing, batch_size,
+                                              format='metadata', metadataHeaders=LIST_HEADERS):
+            if message is not None:
+                fetched[message['id']] = message
+        if store is not None:
+            store.put_headers_many(_header_row(message) for message in fetched.values())
+
+        # Keep Gmail's order, whichever way each row was found
+        for message_id in message_ids:
+            if message_id in stored:
+                _, sender, sent_date, subject = stored[message_id]
+                yield Message(sender, sent_date, subject, LazyBody(service, message_id, store), message_id)
+            elif message_id in fetched:
+                yield _message_from_json(fetched[message_id], LazyBody(service, message_id, store))
+
+
+def getEmails(service, label_ids=('INBOX',), q=None, batch_size=DEFAULT_BATCH_SIZE, store=None):
+    return list(iterEmails(service, label_ids, q, batch_size, store))
+
+
+def iterUnreadEmails(service, batch_size=DEFAULT_BATCH_SIZE, store=None):
+    """Yield Messages from every page of the INBOX; see iterEmails() for other views."""
+    return iterEmails(service, ['INBOX'], None, batch_size, store)
+
+
+def getUnreadEmails(service, batch_size=DEFAULT_BATCH_SIZE, store=None):
+    return list(iterUnreadEmails(service, batch_size, store))
+
+
+def fetchBodies(service, message_ids, store=None, body_format=None):
+    """Fetch and cache the bodies of message_ids in bulk.
+
+    Bodies already cached or stored are not fetched again; the rest come in
+    batched requests, so reading them afterwards needs no further API calls.
+    """
+    body_format = body_format or BODY_FORMAT
+    missing = []
+    for message_id in message_ids:
+        if message_id in body_cache:
+            continue
+        body = store.get_body(message_id) if store is not None else None
+        if body is None:
+            missing.append(message_id)
+        else:
+            body_cache.put(message_id, body)
+
+    for message_id, message in zip(missing, _iter_messages_batched(service, missing, format=body_format)):
+        if message is None:
+            continue
+        body = _body_from_resource(message, body_format)
+        if store is not None:
+            store.put_body(message_id, body)
+        body_cache.put(message_id, body)
+
+
+def iterThreads(service, label_ids=('INBOX',), q=None, batch_size=DEFAULT_BATCH_SIZE, store=None):
+    """Yield a Conversation per thread carrying label_ids and matching q, most recently active first.
+
+    One threads().get(format=metadata) per thread gives the list headers of
+    every message in it, so a long thread costs one call instead of one per
+    message. Bodies are fetched in bulk when the conversation is expanded.
+    """
+    list_kwargs = {}
+    if label_ids:
+        list_kwargs['labelIds'] = list(label_ids)
+    if q:
+        list_kwargs['q'] = q
+
+    for thread_ids in _iter_ids(service, 'threads', **list_kwargs):
+        for thread in _iter_batched(service, 'threads', thread_ids, batch_size,
+                                    format='metadata', metadataHeaders=LIST_HEADERS):
+            if thread is None or not thread.get('messages'):
+                continue
+            if store is not None:
+                store.put_headers_many(_header_row(message) for message in thread['messages'])
+            members = [_message_from_json(message, LazyBody(service, message['id'], store))
+                       for message in thread['messages']]
+            message_ids = [message.id for message in members]
+            yield Conversation(thread['id'], members,
+                               lambda message_ids=message_ids: fetchBodies(service, message_ids, store))
+
+
+def getThreads(service, label_ids=('INBOX',), q=None, batch_size=DEFAULT_BATCH_SIZE, store=None):
+    return list(iterThreads(service, label_ids, q, batch_size, store))
+
+
+def getLabels(service):
+    """Return the mailbox's labels as dicts with 'id', 'name' and 'type' ('system' or 'user')."""
+    request = service.users().labels().list(userId='me')
+    return get_executor().run(lambda: execute_request(request), QUOTA_COSTS['labels.list']).get('labels', [])
+
+
+def getUnreadCounts(service, label_ids):
+    """Return {label id: unread message count}, read from labels().get() rather than by listing.
+
+    Labels that can't be read are left out.
+    """
+    def count(label_id):
+        request = service.users().labels().get(userId='me', id=label_id)
+        return execute_request(request).get('messagesUnread', 0)
+
+    futures = {label_id: get_executor().submit(lambda label_id=label_id: count(label_id), QUOTA_COSTS['labels.get'])
+               for label_id in label_ids}
+    counts = {}
+    for label_id, future in futures.items():
+        try:
+            counts[label_id] = future.result()
+        except (HttpError, OSError) as error:
+            print(f'Failed to read label {label_id}: {error}', file=sys.stderr)
+    return counts
+
+
+def searchEmails(service, store, query, remote=True):
+    """Return Messages matching query, newest first.
+
+    The local full-text index answers first. With remote, Gmail is also
+    asked for its best matches (q=query) so messages that were never synced
+    are found too; see iterRemoteMatches(). Remote failures leave just the
+    local results.
+
+    The UI calls this with remote=False and shows the local results straight
+    away, then appends iterRemoteMatches() in the background, so its list is
+    two groups, each newest first: local matches, then Gmail's other matches.
+    """
+    messages = [Message(sender, sent_date, subject, LazyBody(service, message_id, store), message_id)
+                for message_id, sender, sent_date, subject in store.search(query)]
+    if not remote:
+        return messages
+
+    try:
+        messages.extend(iterRemoteMatches(service, store, query, {message.id for message in messages}))
+    except (HttpError, OSError) as error:
+        print(f'Remote search for {query!r} failed: {error}', file=sys.stderr)
+
+    messages.sort(key=lambda message: message.epoch, reverse=True)
     return messages
 
 
+def iterRemoteMatches(service, store, query, exclude=()):
+    """Yield Messages for Gmail's best matches for query (q=query), newest first, skipping the ids in exclude.
+
+    Their headers are fetched and stored, which also makes them searchable
+    locally next time. Errors are raised to the caller.
+    """
+    request = service.users().messages().list(userId='me', q=query, maxResults=REMOTE_SEARCH_LIMIT)
+    results = get_executor().run(lambda: execute_request(request), QUOTA_COSTS['messages.list'])
+    missing = [r['id'] for r in results.get('messages', []) if r['id'] not in exclude]
+    messages = [message for message in _iter_messages_batched(service, missing, format='metadata',
+                                                               metadataHeaders=LIST_HEADERS)
+                if message is not None]
+    store.put_headers_many(_header_row(message) for message in messages)
+    found = [_message_from_json(message, LazyBody(service, message['id'], store)) for message in messages]
+    found.sort(key=lambda message: message.epoch, reverse=True)
+    yield from found
+
+
+def getAttachmentData(service, message_id, attachment):
+    """Return the base64url encoded content of an attachment listed in a message body.
+
+    Attachments listed from a raw message, and small ones Gmail sends
+    inline, have no attachment id; those are looked up in the full payload.
+    """
+    executor = get_executor()
+    attachment_id = attachment.get('attachment_id')
+    if attachment_id is None:
+        request = service.users().messages().get(userId='me', id=message_id, format='full')
+        payload = executor.run(lambda: execute_request(request), QUOTA_COSTS['messages.get']).get('payload', {})
+        for part in _iter_parts(payload):
+            if part.get('filename') != attachment['filename']:
+                continue
+            if attachment.get('part_id') not in (None, part.get('partId')):
+                continue
+            body = part.get('body', {})
+            if 'data' in body:
+                return body['data']
+            attachment_id = body.get('attachmentId')
+            break
+        if attachment_id is None:
+            raise KeyError(f"Attachment {attachment['filename']} not found in message {message_id}")
+
+    request = service.users().messages().attachments().get(userId='me', messageId=message_id, id=attachment_id)
+    return executor.run(lambda: execute_request(request), QUOTA_COSTS['messages.attachments.get'])['data']
+
+
+def _speech_engine():
+    global _engine
+    if _engine is None:
+        import pyttsx3
+
+        _engine = pyttsx3.init()
+        # This is the speaking rate defaults to 200 words per minute
+        _engine.setProperty('rate', 130)
+    return _engine
+
+
+def buildService(credentials, cache_path=DISCOVERY_CACHE_PATH):
+    """Build the Gmail service from a locally cached discovery document.
+
+    The document is read from cache_path, else taken from the static copy
+    bundled with googleapiclient, and only fetched from the network if
+    neither exists. It is saved to cache_path for the next start.
+    googleapiclient.discovery is imported here, as it is slow to import.
+    """
+    from googleapiclient.discovery import build, build_from_document
+
+    if os.path.exists(cache_path):
+        with open(cache_path) as cache_file:
+            return build_from_document(cache_file.read(), credentials=credentials)
+
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+        document = get_static_doc('gmail', 'v1')
+    except ImportError:
+        document = None
+
+    if document is None:
+        service = build('gmail', 'v1', credentials=credentials, cache_discovery=False)
+        # The service keeps the document it was built from
+        document = json.dumps(service._rootDesc)
+    else:
+        service = build_from_document(document, credentials=credentials)
+
+    with open(cache_path, 'w') as cache_file:
+        cache_file.write(document)
+    return service
+
+
+class OfflineError(ConnectionError):
+    """Raised when Gmail is needed but there is no connection to it."""
+
+
+class DeferredService:
+    """Stands in for a service that is still being built on another thread.
+
+    connect() is called on a background thread to build the real service.
+    Attribute access waits for it, so everything that only holds on to the
+    service can be set up, and the UI drawn from the store, before the
+    network is touched.
+
+    If connecting failed, attribute access raises OfflineError at once; the
+    first access after retry_interval seconds also starts another attempt
+    on a background thread, so the calling thread (often the UI's) never
+    waits on the network. With a retry_interval of None a failed connection
+    is never retried.
+    """
+
+    def __init__(self, connect, retry_interval=RECONNECT_INTERVAL):
+        self._connect = connect
+        self._retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._service = None
+        self._error = None
+        self._failed_at = None
+        self._reconnecting = False
+        self._ready = threading.Event()
+        threading.Thread(target=self._try_connect, daemon=True).start()
+
+    def _try_connect(self):
+        try:
+            self._service = self._connect()
+        except Exception as error:
+            self._error = error
+            self._failed_at = time.monotonic()
+            print(f'Working offline, could not connect to Gmail: {error}', file=sys.stderr)
+        finally:
+            self._ready.set()
+
+    def is_online(self):
+        return self._service is not None
+
+    def _maybe_reconnect(self):
+        """Start connecting again in the background if retry_interval has passed."""
+        with self._lock:
+            if (self._retry_interval is None or self._reconnecting or self._service is not None
+                    or time.monotonic() - self._failed_at < self._retry_interval):
+                return
+            self._reconnecting = True
+        threading.Thread(target=self._reconnect, daemon=True).start()
+
+    def _reconnect(self):
+        try:
+            self._try_connect()
+        finally:
+            with self._lock:
+                self._reconnecting = False
+
+    def _get(self):
+        self._ready.wait()
+        service = self._service
+        if service is None:
+            self._maybe_reconnect()
+            raise OfflineError(f'offline: {self._error}') from self._error
+        return service
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+def offlineService():
+    """Return a service that never connects, for working from the store alone."""
+    def connect():
+        raise OfflineError('offline mode')
+    return DeferredService(connect, retry_interval=None)
+
+
+def markRead(store, message_id):
+    """Mark a message read in the store and queue the change for Gmail; see replayChanges()."""
+    if store.has_label(message_id, 'UNREAD'):
+        store.queue_label_change(message_id, 'UNREAD', added=False)
+
+
+def replayChanges(service, store):
+    """Send the label changes queued in the store to Gmail in bulk.
+
+    Changes are grouped by label and sent with messages().batchModify(), up
+    to BATCH_MODIFY_SIZE messages per call. Changes that fail to send stay
+    queued for the next replay. Returns the number of messages updated.
+    """
+    updated = 0
+    for (label_id, added), message_ids in store.pending_label_changes().items():
+        for start in range(0, len(message_ids), BATCH_MODIFY_SIZE):
+            chunk = message_ids[start:start + BATCH_MODIFY_SIZE]
+            body = {'ids': chunk, 'addLabelIds' if added else 'removeLabelIds': [label_id]}
+            request = service.users().messages().batchModify(userId='me', body=body)
+            get_executor().run(lambda: execute_request(request), QUOTA_COSTS['messages.batchModify'])
+            store.clear_label_changes(chunk, label_id, added)
+            updated += len(chunk)
+    return updated
+
+
 def getEmail(service):
     results = service.users().messages().list(userId='me').execute()
     for r in results.get('messages'):
@@ -149,6 +946,9 @@ def getEmail(service):
         parts = payload.get('parts')
         for p in parts:
             body = p['body']
+            # Only decode inline text parts; attachments are saved through the UI
+            if p.get('filename') or not p['mimeType'].startswith('text/') or 'data' not in body:
+                continue
             data = body['data']
             # print(data)
             # data = data.replace('-', '+')
@@ -157,6 +957,7 @@ def getEmail(service):
             print("%-4s [%-12s]: %s " % (p['partId'], p['mimeType'], body_text))
             if p['mimeType'] == 'text/plain':
                 body_text = replace_urls(body_text, "LINK")
+                engine = _speech_engine()
                 engine.say(body_text)
                 engine.runAndWait()
         break
@@ -166,6 +967,10 @@ def main():
     """Shows basic usage of the Gmail API.
     Lists the user's Gmail labels.
     """
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     creds = None
     # The file token.json stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first
@@ -186,7 +991,7 @@ def main():
 
     try:
         # Call the Gmail API
-        service = build('gmail', 'v1', credentials=creds)
+        service = buildService(creds)
         # results = service.users().labels().list(userId='me').execute()
         # labels = results.get('labels', [])
         #
@@ -0,0 +1,149 @@
+"""
+html_text - converts HTML message bodies to plain text.
+
+Backends:
+    'stdlib' - streaming converter built on html.parser (default, no dependencies)
+    'lxml'   - lxml.html, used only if lxml is installed
+    'bs4'    - BeautifulSoup, used only if bs4 is installed
+
+Input beyond MAX_HTML_SIZE characters (or bytes) is not processed, and
+results are cached by a hash of the input so the same HTML is never
+converted twice.
+"""
+
+import hashlib
+import re
+import time
+from html.parser import HTMLParser
+
+import metrics
+from lru_cache import LRUCache
+
+# Characters of HTML processed per message; newsletters rarely need more
+MAX_HTML_SIZE = 1_000_000
+
+# Number of converted bodies remembered
+HTML_CACHE_SIZE = 64
+
+DEFAULT_BACKEND = 'stdlib'
+
+# Elements whose text is never shown
+SKIP_TAGS = {'script', 'style', 'head', 'template', 'noscript'}
+
+# Elements that start a new line
+BLOCK_TAGS = {'p', 'div', 'br', 'li', 'tr', 'table', 'ul', 'ol', 'blockquote', 'pre', 'hr',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'section', 'article', 'header', 'footer'}
+
+_WHITESPACE = re.compile(r'[ \t\r\f\v\n]+')
+_BLANK_LINES = re.compile(r'\n\s*\n\s*\n+')
+
+_cache = LRUCache(HTML_CACHE_SIZE)
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text as the HTML is fed through, without building a tree."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._pieces = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._newline()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self._newline()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._newline()
+
+    def _newline(self):
+        if self._pieces and self._pieces[-1] != '\n':
+            self._pieces.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._pieces.append(_WHITESPACE.sub(' ', data))
+
+    def text(self):
+        lines = (line.strip() for line in ''.join(self._pieces).split('\n'))
+        return _BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip()
+
+
+def _convert_stdlib(html):
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.text()
+
+
+def _convert_lxml(html):
+    import lxml.html
+
+    document = lxml.html.fromstring(html)
+    for element in document.xpath('//script|//style|//head|//template|//noscript'):
+        element.drop_tree()
+    for element in document.iter(*BLOCK_TAGS):
+        element.tail = '\n' + (element.tail or '')
+    return _BLANK_LINES.sub('\n\n', document.text_content()).strip()
+
+
+def _convert_bs4(html):
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(html, 'html.parser').get_text()
+
+
+BACKENDS = {
+    'stdlib': _convert_stdlib,
+    'lxml': _convert_lxml,
+    'bs4': _convert_bs4,
+}
+
+
+def available_backends():
+    """Return the names of the backends whose dependencies are installed."""
+    names = ['stdlib']
+    for name in ('lxml', 'bs4'):
+        try:
+            __import__(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def html_to_text(html, backend=None):
+    """Convert HTML (str, or UTF-8 bytes) to plain text.
+
+    Unknown or unavailable backends fall back to the stdlib converter.
+    """
+    if isinstance(html, bytes):
+        data = html[:MAX_HTML_SIZE]
+        html = data.decode('utf-8', 'replace')
+    else:
+        html = html[:MAX_HTML_SIZE]
+        data = html.encode('utf-8', 'surrogatepass')
+    backend = backend or DEFAULT_BACKEND
+
+    key = (backend, hashlib.blake2b(data, digest_size=16).digest())
+    text = _cache.get(key)
+    if text is not None:
+        metrics.count('html.cache_hits')
+        return text
+
+    start = time.perf_counter()
+    try:
+        text = BACKENDS.get(backend, _convert_stdlib)(html)
+    except ImportError:
+        text = _convert_stdlib(html)
+    metrics.observe('html.convert', time.perf_counter() - start)
+    _cache.put(key, text)
+    return text
@@ -0,0 +1,90 @@
+"""
+StoredMessageList - windowed, read-only sequence of a label's messages.
+
+Rows are read from the MessageStore a page at a time when they are first
+indexed, and only the pages near the focused row are kept as Message
+objects, so memory stays flat however many messages the label holds.
+Bodies are LazyBody handles backed by the bounded body cache.
+
+When the store changes (a sync adds a batch of messages) the kept pages
+are read again as they are needed, but a message whose row did not
+change keeps its Message object, so caches keyed on it (the UI's row
+strings, the prefetcher's queue) stay valid.
+"""
+
+from Message import Message
+from gmail_interface import LazyBody
+
+PAGE_SIZE = 100
+
+# Pages kept on either side of the focused page
+WINDOW_PAGES = 2
+
+
+class StoredMessageList:
+    def __init__(self, store, label_id, service, page_size=PAGE_SIZE, window_pages=WINDOW_PAGES):
+        self._store = store
+        self._label_id = label_id
+        self._service = service
+        self._page_size = page_size
+        self._window_pages = window_pages
+        self._focus_page = 0
+        # page number -> (store version it was read at, list of (row, Message))
+        self._pages = {}
+        # The (row, Message) of every kept message by id, as of the last store change
+        self._previous = {}
+        self._count = 0
+        self._version = None
+
+    def _check_version(self):
+        """Recount if the store changed underneath us; pages are read again when next used."""
+        if self._version != self._store.version:
+            self._version = self._store.version
+            self._count = self._store.count_with_label(self._label_id)
+            self._previous = self._known()
+
+    def __len__(self):
+        self._check_version()
+        return self._count
+
+    def __getitem__(self, index):
+        self._check_version()
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('message index out of range')
+
+        page_number = index // self._page_size
+        version, page = self._pages.get(page_number, (None, None))
+        if version != self._version:
+            page = self._load_page(page_number)
+        return page[index % self._page_size][1]
+
+    def _load_page(self, page_number):
+        rows = self._store.list_headers(self._label_id, page_number * self._page_size, self._page_size)
+        # Messages may have moved to another page since they were read
+        known = {**self._previous, **self._known()}
+        page = []
+        for row in rows:
+            entry = known.get(row[0])
+            if entry is None or entry[0] != row:
+                message_id, sender, sent_date, subject = row
+                entry = (row, Message(sender, sent_date, subject,
+                                      LazyBody(self._service, message_id, self._store), message_id))
+            page.append(entry)
+        self._pages[page_number] = (self._version, page)
+        self._evict()
+        return page
+
+    def _known(self):
+        return {entry[0][0]: entry for _, entries in self._pages.values() for entry in entries}
+
+    def focus(self, index):
+        """Tell the list which row the user is looking at; far away pages are dropped."""
+        self._focus_page = index // self._page_size
+        self._evict()
+
+    def _evict(self):
+        for page_number in list(self._pages):
+            if abs(page_number - self._focus_page) > self._window_pages:
+                del self._pages[page_number]
@@ -0,0 +1,133 @@
+"""
+MessageLoader - loads the mailbox on a background thread.
+
+MessageLoader fills a plain list from a message iterator. The UI reads
+`messages` while it grows; appends to a list are atomic, so the UI only ever
+sees fully built Message objects.
+
+StoreSyncLoader syncs a MessageStore instead, for use with a
+StoredMessageList that reads the store as it fills.
+
+ChangeReplayer sends label changes queued in the store (messages read
+while offline, or just now) to Gmail in the background.
+"""
+
+import sys
+import threading
+
+from googleapiclient.errors import HttpError
+
+from gmail_interface import replayChanges, syncStore
+
+# Seconds between attempts to send queued changes
+REPLAY_INTERVAL = 60
+
+
+class MessageLoader:
+    def __init__(self, message_iter, messages=None):
+        self.messages = [] if messages is None else messages
+        self.error = None
+        self._message_iter = message_iter
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Start loading in the background. Returns self for chaining."""
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self._load()
+        except Exception as error:
+            self.error = error
+            print(f'Error while loading messages: {error}', file=sys.stderr)
+        finally:
+            self._done.set()
+
+    def _load(self):
+        for message in self._message_iter:
+            self.messages.append(message)
+
+    def is_loading(self):
+        """Check whether more messages may still arrive."""
+        return not self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until loading has finished. Returns True if it has."""
+        return self._done.wait(timeout)
+
+
+class StoreSyncLoader(MessageLoader):
+    def __init__(self, service, store, messages, label_id='INBOX'):
+        super().__init__(None, messages)
+        self._service = service
+        self._store = store
+        self._label_id = label_id
+
+    def _load(self):
+        syncStore(self._service, self._store, self._label_id)
+
+
+class ChangeReplayer:
+    """Sends the store's queued label changes to Gmail from a background thread.
+
+    It runs shortly after nudge() is called and otherwise every interval
+    seconds, so changes made offline go out once the connection is back.
+    """
+
+    def __init__(self, service, store, interval=REPLAY_INTERVAL):
+        self._service = service
+        self._store = store
+        self._interval = interval
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Start replaying in the background. Returns self for chaining."""
+        self._thread.start()
+        return self
+
+    def nudge(self):
+        """Send queued changes now rather than at the next interval."""
+        self._wake.set()
+
+    def _online(self):
+        # A service that is not a DeferredService is always connected
+        is_online = getattr(self._service, 'is_online', None)
+        return is_online is None or is_online()
+
+    def _run(self):
+        failing = False
+        while not self._stopped:
+            failing = self._replay(failing)
+            self._wake.wait(self._interval)
+            self._wake.clear()
+        # Changes queued while the last replay was running go out now
+        if self._online():
+            self._replay(failing)
+
+    def _replay(self, failing):
+        """Send the queued changes, if any. Returns whether sending is failing."""
+        if not self._store.pending_label_changes():
+            return failing
+        try:
+            replayChanges(self._service, self._store)
+        except (HttpError, OSError) as error:
+            # Said once per outage rather than on every retry
+            if not failing:
+                print(f'Label changes kept for later: {error}', file=sys.stderr)
+            return True
+        return False
+
+    def stop(self):
+        """Stop replaying; one last replay is attempted so recent changes are not left behind.
+
+        Without a connection to Gmail nothing is waited for; the changes stay
+        queued in the store for the next start.
+        """
+        self._stopped = True
+        self._wake.set()
+        if self._online():
+            self._thread.join(timeout=5)
@@ -0,0 +1,338 @@
+"""
+MessageStore - on-disk cache of message headers, bodies and label state.
+
+Everything lives in a single SQLite file keyed by Gmail message id, together
+with the historyId of the last sync so later runs only fetch the changes.
+The store is shared between the loader thread and the UI thread, so every
+access goes through one connection guarded by a lock.
+
+Label changes made locally (marking a message read) are applied to the
+store at once and queued in pending_changes until they reach Gmail, so
+they survive going offline and restarting. A sync never undoes a change
+that is still queued.
+
+Sender, subject and body text are also kept in an FTS5 full-text index,
+updated as headers and bodies are stored. If the SQLite build
+has no FTS5, search falls back to a LIKE scan.
+"""
+
+import json
+import sqlite3
+import threading
+
+DEFAULT_PATH = 'mimimail.db'
+
+# Most search results returned at once
+SEARCH_LIMIT = 500
+
+# Ids per IN (...) query, well below SQLite's limit on query parameters
+ID_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    sender TEXT,
+    sent_date TEXT,
+    subject TEXT,
+    internal_date INTEGER NOT NULL DEFAULT 0,
+    body TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_by_date ON messages (internal_date DESC);
+
+CREATE TABLE IF NOT EXISTS message_labels (
+    message_id TEXT NOT NULL REFERENCES messages (id) ON DELETE CASCADE,
+    label_id TEXT NOT NULL,
+    PRIMARY KEY (message_id, label_id)
+);
+CREATE INDEX IF NOT EXISTS message_labels_by_label ON message_labels (label_id);
+
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS pending_changes (
+    message_id TEXT NOT NULL,
+    label_id TEXT NOT NULL,
+    added INTEGER NOT NULL,
+    PRIMARY KEY (message_id, label_id)
+);
+"""
+
+# Full-text index of messages; rowid matches messages.rowid
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE message_search USING fts5 (sender, subject, body, tokenize = 'unicode61 remove_diacritics 2')
+"""
+
+
+class MessageStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # Bumped whenever the set or order of listed messages may have changed
+        self.version = 0
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA foreign_keys = ON')
+            self._conn.executescript(SCHEMA)
+            self._has_fts = self._create_search_index()
+
+    def _create_search_index(self):
+        """Create the full-text index if needed. Returns False if FTS5 is unavailable."""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'message_search'").fetchone()
+        if exists:
+            return True
+        try:
+            self._conn.execute(SEARCH_SCHEMA)
+        except sqlite3.OperationalError:
+            return False
+        # Index whatever an older version of the store already holds
+        self._conn.execute(
+            """INSERT INTO message_search (rowid, sender, subject, body)
+               SELECT rowid, sender, subject, json_extract(body, '$.data') FROM messages""")
+        return True
+
+    def _reindex(self, message_id):
+        """Bring the full-text index row of one message up to date."""
+        if not self._has_fts:
+            return
+        self._unindex(message_id)
+        self._conn.execute(
+            """INSERT INTO message_search (rowid, sender, subject, body)
+               SELECT rowid, sender, subject, json_extract(body, '$.data') FROM messages WHERE id = ?""",
+            (message_id,))
+
+    def _unindex(self, message_id):
+        if self._has_fts:
+            self._conn.execute('DELETE FROM message_search WHERE rowid = (SELECT rowid FROM messages WHERE id = ?)',
+                               (message_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Sync state
+
+    @staticmethod
+    def _history_key(label_id):
+        # Each label is synced on its own; INBOX keeps the key older stores used
+        return 'history_id' if label_id == 'INBOX' else f'history_id/{label_id}'
+
+    def get_history_id(self, label_id='INBOX'):
+        """Return the historyId of the last completed sync of label_id, or None."""
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM state WHERE key = ?',
+                                     (self._history_key(label_id),)).fetchone()
+        return row[0] if row else None
+
+    def set_history_id(self, history_id, label_id='INBOX'):
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)',
+                               (self._history_key(label_id), str(history_id)))
+
+    # Headers and labels
+
+    def put_headers(self, message_id, thread_id, sender, sent_date, subject, internal_date, label_ids):
+        """Insert or update a message's headers and labels, keeping any stored body."""
+        self.put_headers_many([(message_id, thread_id, sender, sent_date, subject, internal_date, label_ids)])
+
+    def put_headers_many(self, rows):
+        """Insert or update many messages at once; see put_headers().
+
+        rows are (message_id, thread_id, sender, sent_date, subject,
+        internal_date, label_ids) tuples. They are written in a single
+        transaction, with one full-text index update per ID_CHUNK messages.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        message_ids = [row[0] for row in rows]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT INTO messages (id, thread_id, sender, sent_date, subject, internal_date)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (id) DO UPDATE SET
+                       thread_id = excluded.thread_id, sender = excluded.sender,
+                       sent_date = excluded.sent_date, subject = excluded.subject,
+                       internal_date = excluded.internal_date""",
+                [(message_id, thread_id, sender, sent_date, subject, int(internal_date or 0))
+                 for message_id, thread_id, sender, sent_date, subject, internal_date, _ in rows])
+            self._conn.executemany('DELETE FROM message_labels WHERE message_id = ?',
+                                   [(message_id,) for message_id in message_ids])
+            self._conn.executemany('INSERT OR IGNORE INTO message_labels (message_id, label_id) VALUES (?, ?)',
+                                   [(row[0], label_id) for row in rows for label_id in row[6] or []])
+            for start in range(0, len(message_ids), ID_CHUNK):
+                chunk = message_ids[start:start + ID_CHUNK]
+                placeholders = ', '.join('?' * len(chunk))
+                # Changes not yet sent to Gmail win over what Gmail last said
+                for message_id, label_id, added in self._conn.execute(
+                        f'SELECT message_id, label_id, added FROM pending_changes WHERE message_id IN ({placeholders})',
+                        chunk).fetchall():
+                    self._apply_label(message_id, label_id, added)
+                if self._has_fts:
+                    self._conn.execute(
+                        f"""DELETE FROM message_search
+                            WHERE rowid IN (SELECT rowid FROM messages WHERE id IN ({placeholders}))""", chunk)
+                    self._conn.execute(
+                        f"""INSERT INTO message_search (rowid, sender, subject, body)
+                            SELECT rowid, sender, subject, json_extract(body, '$.data')
+                            FROM messages WHERE id IN ({placeholders})""", chunk)
+            self.version += 1
+
+    def set_labels(self, message_id, label_ids):
+        """Replace the labels of a stored message. Unknown ids are ignored."""
+        with self._lock, self._conn:
+            if self._conn.execute('SELECT 1 FROM messages WHERE id = ?', (message_id,)).fetchone():
+                self._replace_labels(message_id, label_ids)
+                self.version += 1
+
+    def _replace_labels(self, message_id, label_ids):
+        self._conn.execute('DELETE FROM message_labels WHERE message_id = ?', (message_id,))
+        self._conn.executemany('INSERT INTO message_labels (message_id, label_id) VALUES (?, ?)',
+                               [(message_id, label_id) for label_id in label_ids or []])
+        # Changes not yet sent to Gmail win over what Gmail last said
+        for label_id, added in self._conn.execute(
+                'SELECT label_id, added FROM pending_changes WHERE message_id = ?', (message_id,)).fetchall():
+            self._apply_label(message_id, label_id, added)
+
+    def _apply_label(self, message_id, label_id, added):
+        if added:
+            self._conn.execute('INSERT OR IGNORE INTO message_labels (message_id, label_id) VALUES (?, ?)',
+                               (message_id, label_id))
+        else:
+            self._conn.execute('DELETE FROM message_labels WHERE message_id = ? AND label_id = ?',
+                               (message_id, label_id))
+
+    def remove_label(self, message_ids, label_id):
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM message_labels WHERE message_id = ? AND label_id = ?',
+                                   [(message_id, label_id) for message_id in message_ids])
+            self.version += 1
+
+    def has_label(self, message_id, label_id):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM message_labels WHERE message_id = ? AND label_id = ?',
+                                      (message_id, label_id)).fetchone() is not None
+
+    # Local changes waiting to be sent to Gmail
+
+    def queue_label_change(self, message_id, label_id, added):
+        """Add or remove a label locally and remember to do the same on Gmail."""
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO pending_changes (message_id, label_id, added) VALUES (?, ?, ?)',
+                               (message_id, label_id, int(bool(added))))
+            if self._conn.execute('SELECT 1 FROM messages WHERE id = ?', (message_id,)).fetchone():
+                self._apply_label(message_id, label_id, added)
+            self.version += 1
+
+    def pending_label_changes(self):
+        """Return the queued changes as {(label id, added): [message ids]}."""
+        changes = {}
+        with self._lock:
+            for message_id, label_id, added in self._conn.execute(
+                    'SELECT message_id, label_id, added FROM pending_changes ORDER BY rowid'):
+                changes.setdefault((label_id, bool(added)), []).append(message_id)
+        return changes
+
+    def clear_label_changes(self, message_ids, label_id, added):
+        """Forget queued changes once Gmail has them, unless they were changed again since."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'DELETE FROM pending_changes WHERE message_id = ? AND label_id = ? AND added = ?',
+                [(message_id, label_id, int(bool(added))) for message_id in message_ids])
+
+    def delete(self, message_ids):
+        with self._lock, self._conn:
+            for message_id in message_ids:
+                self._unindex(message_id)
+            self._conn.executemany('DELETE FROM messages WHERE id = ?', [(i,) for i in message_ids])
+            self.version += 1
+
+    def contains(self, message_id):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM messages WHERE id = ?', (message_id,)).fetchone() is not None
+
+    def ids_with_label(self, label_id):
+        """Return the set of stored message ids carrying label_id."""
+        with self._lock:
+            rows = self._conn.execute('SELECT message_id FROM message_labels WHERE label_id = ?', (label_id,))
+            return {row[0] for row in rows}
+
+    def count_with_label(self, label_id):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM message_labels WHERE label_id = ?',
+                                      (label_id,)).fetchone()[0]
+
+    def get_headers(self, message_ids):
+        """Return a dict of (id, sender, sent_date, subject) rows for the stored message_ids."""
+        rows = {}
+        message_ids = list(message_ids)
+        with self._lock:
+            for start in range(0, len(message_ids), ID_CHUNK):
+                chunk = message_ids[start:start + ID_CHUNK]
+                for row in self._conn.execute(
+                        f"""SELECT id, sender, sent_date, subject FROM messages
+                            WHERE id IN ({', '.join('?' * len(chunk))})""", chunk):
+                    rows[row[0]] = row
+        return rows
+
+    def list_headers(self, label_id, offset=0, limit=-1):
+        """Return (id, sender, sent_date, subject) rows for a label, newest first.
+
+        offset and limit select a slice of the rows; a limit of -1 means all.
+        """
+        with self._lock:
+            return self._conn.execute(
+                """SELECT m.id, m.sender, m.sent_date, m.subject
+                   FROM messages m JOIN message_labels l ON l.message_id = m.id
+                   WHERE l.label_id = ?
+                   ORDER BY m.internal_date DESC
+                   LIMIT ? OFFSET ?""", (label_id, limit, offset)).fetchall()
+
+    # Bodies
+
+    def get_body(self, message_id):
+        """Return the stored body dict of a message, or None if it was never fetched."""
+        with self._lock:
+            row = self._conn.execute('SELECT body FROM messages WHERE id = ?', (message_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def put_body(self, message_id, body):
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE messages SET body = ? WHERE id = ?', (json.dumps(body), message_id))
+            self._reindex(message_id)
+
+    # Search
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Return (id, sender, sent_date, subject) rows matching every word of query, newest first.
+
+        Words match sender, subject and any stored body text; the last word
+        also matches as a prefix, so results can follow typing.
+        """
+        words = query.split()
+        if not words:
+            return []
+
+        with self._lock:
+            if self._has_fts:
+                terms = ['"' + word.replace('"', '""') + '"' for word in words]
+                terms[-1] += '*'
+                return self._conn.execute(
+                    """SELECT m.id, m.sender, m.sent_date, m.subject
+                       FROM message_search s JOIN messages m ON m.rowid = s.rowid
+                       WHERE message_search MATCH ?
+                       ORDER BY m.internal_date DESC
+                       LIMIT ?""", (' '.join(terms), limit)).fetchall()
+
+            conditions = ' AND '.join(
+                ["(sender LIKE ? OR subject LIKE ? OR json_extract(body, '$.data') LIKE ?)"] * len(words))
+            parameters = [f'%{word}%' for word in words for _ in range(3)]
+            return self._conn.execute(
+                f"""SELECT id, sender, sent_date, subject FROM messages
+                    WHERE {conditions}
+                    ORDER BY internal_date DESC
+                    LIMIT ?""", parameters + [limit]).fetchall()
@@ -0,0 +1,140 @@
+"""
+metrics - counters and timings for finding where time goes.
+
+Nothing is recorded unless enable() is called (mutt_main --metrics). While
+disabled, count() and observe() return after checking one module global,
+and timed() functions run with a single extra call, so the instrumentation
+can stay in hot paths.
+
+Names are dotted, starting with the area they measure:
+    api.*     Gmail API round trips by method, errors and retries
+    mime.*    body decoding (HTML conversion included)
+    html.*    HTML to text conversion and its cache
+    urls.*    URL replacement
+    ui.*      curses frames, from the start of a redraw to the screen update
+    speech.*  keypress to speech starting, and stop() to silence
+
+snapshot() returns everything as a dict; dump() writes it as JSON.
+"""
+
+import functools
+import json
+import threading
+import time
+from collections import deque
+
+# Recent samples kept per timing, for percentiles
+SAMPLES = 1000
+
+DEFAULT_PATH = 'mimimail-metrics.json'
+
+enabled = False
+
+_lock = threading.Lock()
+_counters = {}
+_timings = {}
+
+
+class _Timing:
+    __slots__ = ('count', 'total', 'max', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def summary(self):
+        """Return count, total and mean, with p50 and p95 over the recent samples, in seconds."""
+        samples = sorted(self.samples)
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count,
+            'p50': samples[len(samples) // 2],
+            'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            'max': self.max,
+        }
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+
+
+def count(name, n=1):
+    """Add n to the counter name."""
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name, seconds):
+    """Record one duration under name."""
+    if not enabled:
+        return
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = _Timing()
+        timing.add(seconds)
+
+
+def timed(name):
+    """Decorator that records how long each call of the function takes under name."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    """Return {'counters': {name: n}, 'timings': {name: summary}}, sorted by name."""
+    with _lock:
+        counters = dict(sorted(_counters.items()))
+        timings = {name: timing.summary() for name, timing in sorted(_timings.items())}
+    return {'counters': counters, 'timings': timings}
+
+
+def report_lines():
+    """Format snapshot() as text lines, timings in milliseconds."""
+    data = snapshot()
+    lines = [f"{'':<36}{'count':>8}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}{'total':>10}"]
+    for name, timing in data['timings'].items():
+        lines.append(f"{name:<36}{timing['count']:>8}" +
+                     ''.join(f'{timing[key] * 1000:>9.2f}' for key in ('mean', 'p50', 'p95', 'max')) +
+                     f"{timing['total'] * 1000:>10.0f}")
+    if data['counters']:
+        lines.append('')
+        lines.extend(f'{name:<36}{value:>8}' for name, value in data['counters'].items())
+    return lines
+
+
+def dump(path=DEFAULT_PATH):
+    """Write snapshot() to path as JSON. Times are in seconds."""
+    data = snapshot()
+    data['written'] = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    return path
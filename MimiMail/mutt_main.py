@@ -1,39 +1,168 @@
 import curses
+from concurrent.futures import ThreadPoolExecutor
 from ui import UI
 from speech_controller import SpeechController
-from gmail_interface import getUnreadEmails
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from audio_cache import AudioCache
+from gmail_interface import SCOPES, DeferredService, buildService, get_executor, iterRemoteMatches, markRead, offlineService, searchEmails
+from message_store import MessageStore
+from message_loader import ChangeReplayer, MessageLoader
+from views import MailViews
+from prefetcher import BodyPrefetcher
+from attachments import AttachmentSaver
+import json
+import metrics
 import os
+import sys
+import threading
+import time
 
-SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+# Render list summaries to audio files ahead of time and play them from disk
+PRERENDER_SPEECH = False
+
+
+class StartupTimer:
+    """Records how long each startup step took, for the report printed on exit."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._steps = []
+        self._lock = threading.Lock()
+
+    def time(self, name, function, *args):
+        """Call function(*args) and record how long it took under name."""
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._steps.append((name, seconds))
+
+    def report(self):
+        with self._lock:
+            steps = list(self._steps)
+        return ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in steps)
 
-def main(stdscr):
-    # Initialize speech controller and speak loading message
-    speech = SpeechController(rate=130)
-    speech.speak("Please wait while I load your email")
+
+def load_credentials():
+    """Return the stored credentials, running the authorization flow if there are none usable.
+
+    The credentials may still need a refresh; see refresh_credentials().
+    """
+    from google.oauth2.credentials import Credentials
 
     creds = None
     if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
+        with open('token.json') as f:
+            info = json.load(f)
+        # Tokens granted for an older, narrower scope have to be authorized
+        # again. Loading the token would report the scopes asked for, not the
+        # ones granted, so they are read from the file.
+        granted = info.get('scopes') or []
+        if isinstance(granted, str):
+            granted = granted.split()
+        if set(SCOPES) <= set(granted):
+            creds = Credentials.from_authorized_user_info(info, SCOPES)
+    if creds and (creds.valid or (creds.expired and creds.refresh_token)):
+        return creds
+
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    flow = InstalledAppFlow.from_client_secrets_file(
+        'credentials.json', SCOPES)
+    creds = flow.run_local_server(port=0)
+    save_credentials(creds)
+    return creds
+
+
+def refresh_credentials(creds):
+    if not creds.valid:
+        from google.auth.transport.requests import Request
+
+        creds.refresh(Request())
+        save_credentials(creds)
 
-    service = build('gmail', 'v1', credentials=creds)
 
-    unread_messages = getUnreadEmails(service)
+def save_credentials(creds):
+    with open('token.json', 'w') as token:
+        token.write(creds.to_json())
 
-    ui = UI(stdscr, speech)
-    ui.draw_menu(unread_messages)
+
+def connect(timer):
+    """Return the Gmail service, refreshing the token while the service is built."""
+    creds = timer.time('credentials', load_credentials)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        refresh = pool.submit(timer.time, 'token refresh', refresh_credentials, creds)
+        service = pool.submit(timer.time, 'service build', buildService, creds)
+        refresh.result()
+        return service.result()
+
+
+def main(stdscr):
+    timer = StartupTimer()
+
+    # Initialize speech controller and speak loading message; the engine
+    # starts on the controller's own thread
+    speech = SpeechController(rate=130, audio_cache=AudioCache() if PRERENDER_SPEECH else None)
+    speech.speak("Please wait while I load your email")
+
+    # Credentials and the service are set up in the background; until they
+    # are ready, anything that needs the network waits for them. If they
+    # can't be set up, everything is served from the store and connecting
+    # is retried now and then
+    if '--offline' in sys.argv:
+        service = offlineService()
+    else:
+        service = DeferredService(lambda: connect(timer))
+
+    # The store syncs on a background thread while the list, read from the
+    # store a page at a time, is drawn right away
+    store = timer.time('store', MessageStore)
+    views = MailViews(service, store)
+    inbox = views.open_label('INBOX', 'Inbox')
+
+    # Messages read while offline are sent to Gmail once it can be reached
+    replayer = ChangeReplayer(service, store).start()
+
+    def mark_read(message):
+        markRead(store, message.id)
+        replayer.nudge()
+
+    def search(query):
+        # Local matches right away, newest first; Gmail's other matches are
+        # appended after them, also newest first, once they have been fetched
+        messages = searchEmails(service, store, query, remote=False)
+        found = {message.id for message in messages}
+        return messages, MessageLoader(iterRemoteMatches(service, store, query, found), messages).start()
+
+    prefetcher = BodyPrefetcher()
+    attachment_saver = AttachmentSaver(service)
+    ui = UI(stdscr, speech, prefetcher, attachment_saver,
+            search=search, views=views, mark_read=mark_read)
+    ui.draw_menu(inbox.messages, inbox.loader, view=inbox)
+    prefetcher.shutdown()
+    attachment_saver.shutdown()
+    replayer.stop()
+
+    if ui.first_frame_at is not None:
+        timer.record('first frame', ui.first_frame_at - timer.start)
+    engine_start = speech.stats()['engine_start']
+    if engine_start is not None:
+        timer.record('speech engine', engine_start)
+    return timer
 
 if __name__ == '__main__':
-    curses.wrapper(main)
+    if '--debug' in sys.argv:
+        import speech_controller
+        import ui
+        speech_controller.DEBUG = ui.DEBUG = True
+    if '--metrics' in sys.argv:
+        metrics.enable()
+
+    timer = curses.wrapper(main)
+    print(f'Startup: {timer.report()}', file=sys.stderr)
+    print(f'Gmail fetch stats: {get_executor().report()}', file=sys.stderr)
+    if metrics.enabled:
+        print(f'Metrics written to {metrics.dump()}', file=sys.stderr)
@@ -0,0 +1,61 @@
+"""
+BodyPrefetcher - loads the bodies of messages around the list cursor.
+
+On every cursor move the bodies of the selected message and of the next and
+previous `radius` messages are queued for fetching on a small thread pool,
+nearest first, so that opening a message does not wait on the network. Work
+queued for messages that have since left the window is cancelled. Decoded
+bodies end up in the bounded body cache that LazyBody reads from.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_RADIUS = 3
+
+
+class BodyPrefetcher:
+    def __init__(self, radius=DEFAULT_RADIUS, max_workers=2):
+        self.radius = radius
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        # Message id -> Future of its body's load; keyed by id rather than by
+        # LazyBody, since a list may hand out a new Message for the same id
+        self._pending = {}
+
+    def update(self, messages, index):
+        """Prefetch bodies around index, dropping work that is out of range."""
+        # The message under the cursor first, then outwards
+        indexes = [index]
+        for distance in range(1, self.radius + 1):
+            indexes.extend((index + distance, index - distance))
+
+        wanted = {}
+        for i in indexes:
+            if 0 <= i < len(messages):
+                # Conversations have no body of their own; theirs load when expanded
+                body = getattr(messages[i], 'body', None)
+                if hasattr(body, 'load') and not body.is_loaded():
+                    message_id = getattr(messages[i], 'id', None)
+                    wanted[body if message_id is None else message_id] = body
+
+        for message_id in list(self._pending):
+            future = self._pending[message_id]
+            if future.done() or (message_id not in wanted and future.cancel()):
+                del self._pending[message_id]
+
+        for message_id, body in wanted.items():
+            if message_id not in self._pending:
+                self._pending[message_id] = self._pool.submit(self._load, body)
+
+    @staticmethod
+    def _load(body):
+        try:
+            body.load()
+        except Exception:
+            # The body is fetched again, and the error shown, when it is opened
+            pass
+
+    def shutdown(self):
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._pool.shutdown(wait=False)
@@ -3,30 +3,165 @@ SpeechController - Thread-safe TTS controller using command queue pattern.
 
 Single thread owns the pyttsx3 engine and processes all speech commands.
 UI communicates via thread-safe methods, no shared mutable state.
+
+Long texts are spoken in chunks that end on sentence (or, for very long
+sentences, clause) boundaries, so pausing and resuming never cuts a
+sentence in half. The next chunk is queued on the engine while the
+current one plays, so there is no gap between chunks.
+
+The worker drives the engine itself with startLoop(False)/iterate()
+instead of blocking in runAndWait(), so it can act on stop() between two
+iterations: stop() sets an event that wakes the worker at once, and the
+time until the engine is stopped is recorded as the stop latency. Drivers
+whose iterate() can't be used that way (see _can_iterate()) are run with
+runAndWait() instead, and stopped from the started-word callback, so
+stopping takes up to a word there.
+
+speak_summary() is for speech that only matters if it is the latest, such
+as the summary of the row under the cursor: it silences whatever is
+playing at once, but only speaks once no newer summary has come in for
+settle_delay seconds, so holding an arrow key doesn't start and stop the
+engine for every row passed.
+
+With an AudioCache, prerender() renders the summaries of the rows around
+the cursor to audio files while the engine is otherwise idle, and a
+summary that has a clip is played from it straight away instead of being
+synthesized. Anything without a clip is spoken live as before.
+
+With metrics enabled, the time from speak() or speak_summary() to the
+speech being heard is recorded as speech.key_to_speech, and the stop
+latency as speech.stop_to_silence.
 """
 
-import pyttsx3
+import inspect
+import re
 import threading
 import queue
 import sys
 import time
+from collections import deque
+
+import metrics
+
+# Print what the worker is doing to stderr; mutt_main --debug turns it on
+DEBUG = False
+
+# Longest wait between two engine.iterate() calls while speaking, in seconds
+ITERATE_INTERVAL = 0.01
+
+# Seconds a summary must stay the latest before it is spoken
+SETTLE_DELAY = 0.15
+
+# Stop latencies kept for stats()
+LATENCY_SAMPLES = 100
+
+# Words per spoken chunk to aim for; chunks only end on sentence or clause boundaries
+CHUNK_WORDS = 30
+
+# Sentence ends: terminal punctuation, possibly closed by a quote or bracket, then space; or a blank line
+_SENTENCE_END = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+|\n\s*\n')
+_CLAUSE_END = re.compile(r'(?<=[,;:])\s+')
+
+
+def _pack(pieces, chunk_words, split_long):
+    """Join consecutive pieces into chunks of at most chunk_words words.
+
+    A piece too long for a chunk of its own is broken up with split_long.
+    """
+    chunks = []
+    current = []
+    current_words = 0
+    for piece in pieces:
+        piece = ' '.join(piece.split())
+        if not piece:
+            continue
+        length = piece.count(' ') + 1
+        if current and current_words + length > chunk_words:
+            chunks.append(' '.join(current))
+            current, current_words = [], 0
+        if length > chunk_words:
+            chunks.extend(split_long(piece))
+        else:
+            current.append(piece)
+            current_words += length
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def _split_words(text, chunk_words):
+    words = text.split()
+    return [' '.join(words[start:start + chunk_words]) for start in range(0, len(words), chunk_words)]
+
+
+def split_chunks(text, chunk_words=CHUNK_WORDS):
+    """Split text into chunks of about chunk_words words for speaking.
+
+    Whole sentences are packed into each chunk while they fit. A sentence
+    longer than chunk_words is packed the same way by clauses, and a clause
+    longer than that by words.
+    """
+    def split_sentence(sentence):
+        return _pack(_CLAUSE_END.split(sentence), chunk_words,
+                     lambda clause: _split_words(clause, chunk_words))
+
+    return _pack(_SENTENCE_END.split(text), chunk_words, split_sentence)
 
-DEBUG = True
 
 def debug(msg):
     if DEBUG:
         print(f"[SPEECH] {msg}", file=sys.stderr, flush=True)
 
 
+def _can_iterate(engine):
+    """Check whether the engine's driver can be driven with startLoop(False) and iterate().
+
+    In pyttsx3 2.99 some drivers' iterate() is a plain function rather than
+    a generator, so the first engine.iterate() raises TypeError. The macOS
+    driver's iterate() never runs the loop that delivers callbacks, so
+    finished-utterance would never fire. Both are run with runAndWait().
+    """
+    driver = getattr(getattr(engine, 'proxy', None), '_driver', None)
+    if driver is None or type(driver).__module__.rsplit('.', 1)[-1] == 'nsss':
+        return False
+    return inspect.isgeneratorfunction(getattr(driver, 'iterate', None))
+
+
 class SpeechController:
-    def __init__(self, rate=130):
+    def __init__(self, rate=130, chunk_words=CHUNK_WORDS, settle_delay=SETTLE_DELAY, audio_cache=None):
         self._command_queue = queue.Queue()
         self._rate = rate
-
-        # State owned exclusively by worker thread
-        self._resumable_words = []
+        self._chunk_words = chunk_words
+        self._settle_delay = settle_delay
+        # Optional AudioCache of pre-rendered clips; unused if there is no player
+        self._audio_cache = audio_cache if audio_cache is not None and audio_cache.is_usable() else None
+
+        # State owned exclusively by worker thread: the resumable text, its
+        # chunks (split once per text) and the index of the next chunk to speak
+        self._resumable_text = None
+        self._resumable_chunks = []
         self._resumable_index = 0
 
+        # Worker-owned state of the speech in progress. Utterance names carry
+        # the generation, so callbacks for interrupted speech are ignored.
+        self._generation = 0
+        self._outstanding = 0
+        self._resumable = False
+        self._next_chunk = 0
+        # Commands that arrived while speaking and wait for it to end
+        self._deferred = deque()
+        # Worker-owned: the clip player process, and clips being rendered by utterance tag
+        self._player = None
+        self._rendering = {}
+        self._renders = 0
+        self._voice = None
+        # Whether the engine is driven with iterate(), or else with runAndWait()
+        self._iterating = False
+        # Utterances queued on the engine so far
+        self._said = 0
+        # When the speech being started was asked for, until it can be heard
+        self._start_requested_at = None
+
         # Thread-safe state for UI to query
         self._speaking_lock = threading.Lock()
         self._is_speaking = False
@@ -34,6 +169,27 @@ class SpeechController:
         # UI-side intent tracking (set immediately when speak/stop called)
         self._user_wants_speech = False
 
+        # Set by stop() to interrupt the worker mid-utterance
+        self._interrupt = threading.Event()
+        self._stop_requested_at = None
+        self._stop_latencies = deque(maxlen=LATENCY_SAMPLES)
+        # Seconds pyttsx3.init() took, once the worker has started the engine
+        self._engine_start = None
+        self._stats_lock = threading.Lock()
+
+        # The latest summary waiting to settle, and when it may be spoken
+        self._summary_lock = threading.Lock()
+        self._summary = None
+        self._summary_due = 0
+        # Summaries replaced by a newer one before being spoken, and queued
+        # speech thrown away by stop()
+        self._coalesced = 0
+        self._dropped = 0
+        # Summaries to render to the audio cache once idle; only the latest set is kept
+        self._render_texts = None
+        self._clips_played = 0
+        self._clips_missed = 0
+
         # Start worker thread - engine will be created there
         self._running = True
         self._worker = threading.Thread(target=self._worker_loop, daemon=True)
@@ -43,125 +199,379 @@ class SpeechController:
         """Main loop - processes commands and owns the TTS engine."""
         # Create engine in worker thread - only place engine is ever created
         debug("Creating engine in worker thread")
-        engine = pyttsx3.init()
-        engine.setProperty('rate', self._rate)
+        start = time.perf_counter()
+        try:
+            # Imported here too, so that the slow import happens off the UI thread
+            import pyttsx3
+            engine = pyttsx3.init()
+            engine.setProperty('rate', self._rate)
+        except Exception as error:
+            print(f"Speech is unavailable: {error}", file=sys.stderr)
+            self._running = False
+            return
+        self._engine_start = time.perf_counter() - start
+        self._voice = engine.getProperty('voice')
+        engine.connect('started-utterance', self._on_started)
+        engine.connect('started-word', lambda name, location, length: self._on_word(engine))
+        engine.connect('finished-utterance', lambda name, completed: self._on_finished(engine, name, completed))
+        self._iterating = _can_iterate(engine)
+        debug(f"Driving the engine with {'iterate()' if self._iterating else 'runAndWait()'}")
+        if self._iterating:
+            engine.startLoop(False)
 
         while self._running:
             try:
-                # Wait for command with timeout to allow checking _running
-                cmd = self._command_queue.get(timeout=0.1)
-            except queue.Empty:
-                continue
-
-            if cmd[0] == 'SPEAK':
-                _, text, resumable = cmd
-                debug(f"Processing SPEAK resumable={resumable} len={len(text)}")
-                self._do_speak(engine, text, resumable)
-            elif cmd[0] == 'STOP':
-                debug("Processing STOP")
-                self._do_stop(engine)
-            elif cmd[0] == 'SET_RATE':
-                _, rate = cmd
-                self._rate = rate
-                engine.setProperty('rate', rate)
-            elif cmd[0] == 'SHUTDOWN':
-                self._running = False
-                break
-            elif cmd[0] == 'RESET_RESUMABLE':
-                debug("Processing RESET_RESUMABLE")
-                self._resumable_words = []
-                self._resumable_index = 0
-
-            self._command_queue.task_done()
+                self._step(engine)
+            except Exception as error:
+                # A driver error must not leave speech dead for the rest of the session
+                print(f"Speech error: {error!r}", file=sys.stderr)
+                self._recover(engine)
 
         # Cleanup
         try:
             engine.stop()
+            if self._iterating:
+                engine.endLoop()
         except:
             pass
 
-    def _do_speak(self, engine, text, resumable):
-        """Execute speak command."""
+    def _step(self, engine):
+        """Do one round of the worker loop."""
+        if self._outstanding or self._rendering or self._player is not None:
+            # Speaking: keep the engine going, waking early if stop() is called
+            if self._interrupt.is_set():
+                self._interrupt_speech(engine)
+                return
+            if (self._rendering and not self._outstanding and self._player is None
+                    and (self._summary_waiting() or not self._command_queue.empty())):
+                # Rendering ahead must never hold up anything the user asked for
+                self._cancel_renders(engine)
+                return
+            self._poll_commands(engine)
+            if self._player is not None and self._player.poll() is not None:
+                self._player = None
+                if not self._outstanding:
+                    self._finish()
+            self._pump(engine)
+            return
+
+        # Idle: block until there is something to do
+        if self._deferred:
+            cmd = self._deferred.popleft()
+        else:
+            cmd = self._next_command()
+        self._handle(engine, cmd)
+
+    def _pump(self, engine):
+        """Let the engine make progress on what is queued on it."""
+        if self._iterating:
+            engine.iterate()
+            self._interrupt.wait(ITERATE_INTERVAL)
+        elif self._outstanding or self._rendering:
+            said = self._said
+            # Returns when everything queued is spoken, or _on_word() stopped it
+            engine.runAndWait()
+            if self._interrupt.is_set():
+                # The callbacks may already have ended the speech, so act on it here
+                self._interrupt_speech(engine)
+            elif self._said == said:
+                self._run_finished()
+        else:
+            # Only a clip is playing
+            self._interrupt.wait(ITERATE_INTERVAL)
+
+    def _run_finished(self):
+        """Wrap up after runAndWait() spoke everything queued without queueing more.
+
+        Normally finished-utterance has already done this; it covers drivers
+        that don't report every utterance.
+        """
+        for temp_path in self._rendering.values():
+            self._audio_cache.add(temp_path)
+        self._rendering = {}
+        if self._outstanding:
+            self._outstanding = 0
+            if self._resumable:
+                self._reset_resumable()
+            if self._player is None:
+                self._finish()
+
+    def _recover(self, engine):
+        """Drop the speech in progress after an error, so the next request starts clean."""
+        self._generation += 1
+        try:
+            engine.stop()
+        except Exception:
+            pass
+        if self._player is not None:
+            self._player.terminate()
+            self._player = None
+        for temp_path in self._rendering.values():
+            self._audio_cache.discard(temp_path)
+        self._rendering = {}
+        self._interrupt.clear()
+        self._finish()
+
+    def _next_command(self):
+        """Block until a command arrives or the pending summary has settled.
+
+        With nothing else to do, summaries waiting to be pre-rendered are rendered.
+        """
+        while True:
+            with self._summary_lock:
+                text = self._summary
+                remaining = self._summary_due - time.perf_counter()
+                if text is not None and remaining <= 0:
+                    self._summary = None
+                    # Timed from the key press that asked for it, settling included
+                    return ('SPEAK', text, False, self._summary_due - self._settle_delay)
+                if text is None and self._render_texts and self._command_queue.empty():
+                    texts, self._render_texts = self._render_texts, None
+                    return ('RENDER', texts)
+
+            try:
+                cmd = self._command_queue.get(timeout=None if text is None else remaining)
+            except queue.Empty:
+                continue
+            self._command_queue.task_done()
+            # WAKE only makes the worker look at the pending summary and renders again
+            if cmd[0] != 'WAKE':
+                return cmd
+
+    def _summary_waiting(self):
+        with self._summary_lock:
+            return self._summary is not None
+
+    def _handle(self, engine, cmd):
+        if cmd[0] == 'SPEAK':
+            _, text, resumable, requested_at = cmd
+            debug(f"Processing SPEAK resumable={resumable} len={len(text)}")
+            self._do_speak(engine, text, resumable, requested_at)
+        elif cmd[0] == 'STOP':
+            debug("Processing STOP")
+            self._drop_deferred()
+            self._do_stop(engine)
+        elif cmd[0] == 'SET_RATE':
+            _, rate = cmd
+            self._rate = rate
+            engine.setProperty('rate', rate)
+        elif cmd[0] == 'SHUTDOWN':
+            self._running = False
+        elif cmd[0] == 'RESET_RESUMABLE':
+            debug("Processing RESET_RESUMABLE")
+            self._reset_resumable()
+        elif cmd[0] == 'RENDER':
+            _, texts = cmd
+            self._render(engine, texts)
+
+    def _poll_commands(self, engine):
+        """Take commands without blocking while speaking.
+
+        Rate changes apply to the next utterance; anything else waits until
+        the current speech ends, except SHUTDOWN, which also stops it.
+        """
+        while True:
+            try:
+                cmd = self._command_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._command_queue.task_done()
+            if cmd[0] == 'SET_RATE':
+                self._handle(engine, cmd)
+            elif cmd[0] == 'SHUTDOWN':
+                self._interrupt_speech(engine)
+                self._running = False
+                return
+            elif cmd[0] == 'STOP':
+                # The stop itself is acted on through the interrupt event
+                self._drop_deferred()
+            elif cmd[0] != 'WAKE':
+                # WAKE is acted on once idle
+                self._deferred.append(cmd)
+
+    def _drop_deferred(self):
+        """Forget the speech asked for before a stop; other deferred commands still run."""
+        dropped = sum(1 for cmd in self._deferred if cmd[0] == 'SPEAK')
+        if dropped:
+            self._deferred = deque(cmd for cmd in self._deferred if cmd[0] != 'SPEAK')
+            with self._stats_lock:
+                self._dropped += dropped
+
+    def _do_speak(self, engine, text, resumable, requested_at):
+        """Execute speak command. The speech then runs from the worker loop."""
         with self._speaking_lock:
             self._is_speaking = True
+        self._start_requested_at = requested_at
 
         if resumable:
             self._speak_resumable(engine, text)
-        else:
+        elif not self._play_clip(text):
             self._speak_simple(engine, text)
 
-        with self._speaking_lock:
-            self._is_speaking = False
+        if not self._outstanding and self._player is None:
+            self._finish()
+
+    def _play_clip(self, text):
+        """Play text from the audio cache. Returns False if there is no clip for it."""
+        if self._audio_cache is None:
+            return False
+        path = self._audio_cache.lookup(text, self._rate, self._voice)
+        if path is None:
+            with self._stats_lock:
+                self._clips_missed += 1
+            return False
+        try:
+            self._player = self._audio_cache.play(path)
+        except OSError as error:
+            debug(f"Failed to play clip: {error}")
+            return False
+        with self._stats_lock:
+            self._clips_played += 1
+        self._speech_started()
+        return True
+
+    def _render(self, engine, texts):
+        """Queue clips on the engine for the texts that have none yet."""
+        for text in texts:
+            if self._audio_cache.lookup(text, self._rate, self._voice) is not None:
+                continue
+            temp_path = self._audio_cache.render_path(text, self._rate, self._voice)
+            if temp_path in self._rendering.values():
+                continue
+            self._renders += 1
+            tag = f"render{self._renders}"
+            engine.save_to_file(text, temp_path, f"{self._generation}:{tag}")
+            self._rendering[tag] = temp_path
+            self._said += 1
+
+    def _cancel_renders(self, engine):
+        self._generation += 1
+        try:
+            engine.stop()
+        except:
+            pass
+        for temp_path in self._rendering.values():
+            self._audio_cache.discard(temp_path)
+        self._rendering = {}
 
-        # Clear user intent when speech completes naturally
-        self._user_wants_speech = False
+    def _say(self, engine, text, tag):
+        engine.say(text, f"{self._generation}:{tag}")
+        self._outstanding += 1
+        self._said += 1
 
     def _speak_simple(self, engine, text):
         """Speak entire text without tracking position."""
         # Do NOT clear resumable state - we want to preserve it for message body
-        # Check for stop before speaking
-        try:
-            cmd = self._command_queue.get_nowait()
-            if cmd[0] == 'STOP':
-                self._command_queue.task_done()
-                return
-            else:
-                # Put it back if it's not a stop
-                self._command_queue.put(cmd)
-        except queue.Empty:
-            pass
-
-        engine.say(text)
-        engine.runAndWait()
+        self._resumable = False
+        self._say(engine, text, 'simple')
 
     def _speak_resumable(self, engine, text):
-        """Speak text with pause/resume support."""
-        words = text.split()
+        """Speak text with pause/resume support.
 
+        One chunk is always queued behind the one playing. When a chunk
+        finishes, the finished-utterance callback records the position and
+        queues the next chunk.
+        """
         # Check if resuming same text
-        if words == self._resumable_words and self._resumable_index > 0:
-            start_index = self._resumable_index
-            debug(f"Resuming from index {start_index}")
+        if text == self._resumable_text and self._resumable_index > 0:
+            debug(f"Resuming from chunk {self._resumable_index}")
         else:
-            self._resumable_words = words
+            self._resumable_text = text
+            self._resumable_chunks = split_chunks(text, self._chunk_words)
             self._resumable_index = 0
-            start_index = 0
-            debug(f"Starting fresh with {len(words)} words")
-
-        chunk_size = 20
-        current_index = start_index
-
-        while current_index < len(self._resumable_words):
-            # Check for stop command (non-blocking)
-            try:
-                cmd = self._command_queue.get_nowait()
-                if cmd[0] == 'STOP':
-                    self._resumable_index = current_index
-                    debug(f"STOP received at index {current_index}")
-                    self._command_queue.task_done()
-                    return
-                elif cmd[0] == 'SET_RATE':
-                    _, rate = cmd
-                    self._rate = rate
-                    engine.setProperty('rate', rate)
-                    self._command_queue.task_done()
-                # Ignore other commands while speaking
-            except queue.Empty:
-                pass
-
-            end_index = min(current_index + chunk_size, len(self._resumable_words))
-            chunk = ' '.join(self._resumable_words[current_index:end_index])
+            debug(f"Starting fresh with {len(self._resumable_chunks)} chunks")
+
+        self._resumable = True
+        self._next_chunk = self._resumable_index
+        self._queue_next_chunk(engine)
+        self._queue_next_chunk(engine)
+
+    def _queue_next_chunk(self, engine):
+        if self._next_chunk < len(self._resumable_chunks):
+            chunk = self._resumable_chunks[self._next_chunk]
+            debug(f"Queueing chunk {self._next_chunk}: {chunk[:50]}...")
+            self._say(engine, chunk, self._next_chunk)
+            self._next_chunk += 1
+
+    def _on_started(self, name):
+        """started-utterance callback; runs on the worker thread inside iterate()."""
+        generation, _, tag = (name or '').partition(':')
+        if generation == str(self._generation) and not tag.startswith('render'):
+            self._speech_started()
+
+    def _on_word(self, engine):
+        """started-word callback. Without iterate() it is where a stop() can cut speech short."""
+        if not self._iterating and self._interrupt.is_set():
+            engine.stop()
 
-            debug(f"Speaking chunk {current_index}-{end_index}: {chunk[:50]}...")
-            engine.say(chunk)
-            engine.runAndWait()
+    def _speech_started(self):
+        """Record how long the speech just heard took to start, if it is the first of its request."""
+        if self._start_requested_at is not None:
+            metrics.observe('speech.key_to_speech', time.perf_counter() - self._start_requested_at)
+            self._start_requested_at = None
+
+    def _on_finished(self, engine, name, completed):
+        """finished-utterance callback; runs on the worker thread inside iterate()."""
+        generation, _, tag = (name or '').partition(':')
+        if generation != str(self._generation):
+            return
+
+        if tag.startswith('render'):
+            temp_path = self._rendering.pop(tag, None)
+            if temp_path is not None:
+                if completed:
+                    self._audio_cache.add(temp_path)
+                else:
+                    self._audio_cache.discard(temp_path)
+            return
+
+        self._outstanding -= 1
+        if self._resumable and tag != 'simple':
+            # The chunk after this one is already playing; resume from it if stopped now
+            self._resumable_index = int(tag) + 1
+            self._queue_next_chunk(engine)
+
+        if not self._outstanding:
+            if self._resumable and self._resumable_index >= len(self._resumable_chunks):
+                # Finished completely - reset
+                debug("Finished speaking all text")
+                self._reset_resumable()
+            self._finish()
+
+    def _finish(self):
+        """Mark the current speech as over."""
+        self._outstanding = 0
+        self._resumable = False
+        with self._speaking_lock:
+            self._is_speaking = False
 
-            current_index = end_index
-            self._resumable_index = current_index
+        # Clear user intent when speech completes naturally
+        self._user_wants_speech = False
 
-        # Finished completely - reset
-        debug("Finished speaking all text")
-        self._resumable_words = []
+    def _interrupt_speech(self, engine):
+        """Stop the engine mid-utterance because stop() was called."""
+        debug(f"Interrupted at chunk {self._resumable_index}")
+        requested_at = self._stop_requested_at
+        # Take in the STOP, dropping the speech that was waiting behind this one
+        self._poll_commands(engine)
+        if self._player is not None:
+            self._player.terminate()
+            self._player = None
+        if self._rendering:
+            self._cancel_renders(engine)
+        self._generation += 1
+        self._do_stop(engine)
+        self._outstanding = 0
+        self._resumable = False
+        if requested_at is not None:
+            latency = time.perf_counter() - requested_at
+            with self._stats_lock:
+                self._stop_latencies.append(latency)
+            metrics.observe('speech.stop_to_silence', latency)
+
+    def _reset_resumable(self):
+        self._resumable_text = None
+        self._resumable_chunks = []
         self._resumable_index = 0
 
     def _do_stop(self, engine):
@@ -174,25 +584,70 @@ class SpeechController:
         with self._speaking_lock:
             self._is_speaking = False
 
+        # Speech stopped before it was heard doesn't count as started late
+        self._start_requested_at = None
+        self._interrupt.clear()
+        with self._stats_lock:
+            self._stop_requested_at = None
+
     # Public API - thread-safe methods for UI
 
     def speak(self, text, resumable=False):
         """Start speaking text. If resumable=True, supports pause/resume."""
         self._user_wants_speech = True
-        self._command_queue.put(('SPEAK', text, resumable))
+        self._command_queue.put(('SPEAK', text, resumable, time.perf_counter()))
+
+    def speak_summary(self, text):
+        """Silence current speech and speak text once it has been the latest summary for settle_delay.
+
+        Never blocks. A summary replaced before it is spoken is counted as coalesced.
+        """
+        self.stop()
+        self._user_wants_speech = True
+        with self._summary_lock:
+            self._summary = text
+            self._summary_due = time.perf_counter() + self._settle_delay
+        self._command_queue.put(('WAKE',))
+
+    def prerender(self, texts):
+        """Render texts (the summaries around the cursor) to the audio cache while idle.
+
+        Replaces any texts from an earlier call that haven't been rendered yet.
+        Does nothing without an audio cache.
+        """
+        if self._audio_cache is None:
+            return
+        with self._summary_lock:
+            self._render_texts = list(texts)
+        self._command_queue.put(('WAKE',))
 
     def stop(self):
         """Stop current speech."""
         self._user_wants_speech = False
+        with self._summary_lock:
+            if self._summary is not None:
+                self._summary = None
+                self._coalesced += 1
+
         # Clear any pending commands first
+        dropped = 0
         try:
             while True:
-                self._command_queue.get_nowait()
+                cmd = self._command_queue.get_nowait()
                 self._command_queue.task_done()
+                if cmd[0] == 'SPEAK':
+                    dropped += 1
         except queue.Empty:
             pass
 
+        with self._stats_lock:
+            self._dropped += dropped
+            if self._stop_requested_at is None:
+                self._stop_requested_at = time.perf_counter()
+        # Queued before the interrupt, so the worker always finds it when woken
         self._command_queue.put(('STOP',))
+        # Wakes the worker straight away if it is speaking
+        self._interrupt.set()
 
     def set_rate(self, rate):
         """Set speech rate."""
@@ -202,6 +657,30 @@ class SpeechController:
         """Check if user has requested speech (immediate response, no queue delay)."""
         return self._user_wants_speech
 
+    def stats(self):
+        """Return speech counters and stop latency figures.
+
+        Latencies are in seconds, from stop() to the engine being stopped mid-speech.
+        """
+        with self._stats_lock:
+            latencies = list(self._stop_latencies)
+            dropped = self._dropped
+            clips_played = self._clips_played
+            clips_missed = self._clips_missed
+        with self._summary_lock:
+            coalesced = self._coalesced
+        return {
+            'engine_start': self._engine_start,
+            'coalesced': coalesced,
+            'dropped': dropped,
+            'clips_played': clips_played,
+            'clips_missed': clips_missed,
+            'stops': len(latencies),
+            'stop_latency_last': latencies[-1] if latencies else None,
+            'stop_latency_max': max(latencies) if latencies else None,
+            'stop_latency_mean': sum(latencies) / len(latencies) if latencies else None,
+        }
+
     def shutdown(self):
         """Shutdown the controller."""
         self.stop()
@@ -1,13 +1,37 @@
 import curses
 import textwrap
 import sys
-from gmail_interface import replace_urls
+import threading
+import time
+from datetime import date
+import metrics
+from gmail_interface import OfflineError, replace_urls
+from Conversation import Conversation
+
+# Rendered list rows to keep before starting over
+ROW_CACHE_SIZE = 2000
+
+# Rows on either side of the cursor whose spoken summaries are rendered ahead
+PRERENDER_RADIUS = 3
+
+# Print UI events to stderr; mutt_main --debug turns it on
+DEBUG = False
 
 def debug(msg):
-    print(f"[UI] {msg}", file=sys.stderr, flush=True)
+    if DEBUG:
+        print(f"[UI] {msg}", file=sys.stderr, flush=True)
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
 
 class UI:
-    def __init__(self, stdscr, speech):
+    def __init__(self, stdscr, speech, prefetcher=None, attachment_saver=None, search=None, views=None,
+                 mark_read=None):
         self.stdscr = stdscr
         self.cursor_x = 0
         self.cursor_y = 0
@@ -19,84 +43,161 @@ class UI:
         # Speech controller passed from main (single instance for whole app)
         self.speech = speech
 
+        # Optional BodyPrefetcher that loads bodies around the cursor
+        self.prefetcher = prefetcher
+
+        # Optional AttachmentSaver; without one attachments are not offered
+        self.attachment_saver = attachment_saver
+
+        # Optional callable(query) returning (messages, loader): the local
+        # matches, and a MessageLoader appending Gmail's other matches after
+        # them, or None; enables '/'
+        self.search = search
+
+        # Optional MailViews; enables 'v' to switch label or query
+        self.views = views
+
+        # Optional callable(message) called when a message is opened
+        self.mark_read = mark_read
+
+        # time.perf_counter() when the first list frame reached the screen, for the startup report
+        self.first_frame_at = None
+
+        # What the message list currently shows on screen, for redrawing only what changed
+        self._menu_size = None
+        self._drawn_status = None
+        self._drawn_rows = {}
+        # Rendered list row strings by id(message): (message, width, day, text)
+        self._row_cache = {}
+
+        # Wrapped body lines of the open message and the (message, width, show_urls) they were built for
+        self._layout_key = None
+        self._layout_lines = []
+
         # Start colors in curses
         curses.start_color()
         curses.init_pair(1, curses.COLOR_CYAN, curses.COLOR_BLACK)
         curses.init_pair(2, curses.COLOR_RED, curses.COLOR_BLACK)
         curses.init_pair(3, curses.COLOR_BLACK, curses.COLOR_WHITE)
 
-    def draw_menu(self, messages):
+    def draw_menu(self, messages, loader=None, title="MimiMail - Mutt Edition", view=None):
+        """Show the message list.
+
+        messages may be a list or a windowed view such as StoredMessageList,
+        and may keep growing while the menu is open; pass the loader that
+        fills it so the list is redrawn as new messages arrive. Rows may also
+        be Conversations, which Enter expands. view is the MailViews View
+        being shown, if any, so 'c' can switch it to or from conversations.
+        """
         k = 0
+        announced = False
         # Clear and refresh the screen for a blank canvas
         self.stdscr.clear()
         self.stdscr.refresh()
+        self._invalidate_menu()
 
         # Loop where k is the last character pressed
         while (k != ord('q')):
+            frame_start = time.perf_counter()
 
             # Initialization
-            self.stdscr.clear()
             height, width = self.stdscr.getmaxyx()
+            if (height, width) != self._menu_size:
+                self._invalidate_menu()
             
             max_messages = height - 4
 
-            if k == 0 and self.speak_on_scroll and len(messages) > 0:
+            # Poll for newly loaded messages while the loader is still running
+            loading = loader is not None and loader.is_loading()
+            self.stdscr.timeout(100 if loading else -1)
+
+            if not announced and self.speak_on_scroll and len(messages) > 0:
                 self.speech.speak(messages[self.cursor_y].get_speech_summary())
+                announced = True
 
             # Declaration of strings
-            title = "MimiMail - Mutt Edition"[:width-1]
             statusbarstr = f"Press 'q' to exit | 't' to toggle speak on scroll ({'On' if self.speak_on_scroll else 'Off'})"
-
-            # Centering calculations
-            start_x_title = int((width // 2) - (len(title) // 2) - len(title) % 2)
-
-            # Render status bar
-            self.stdscr.attron(curses.color_pair(3))
-            self.stdscr.addstr(height-1, 0, statusbarstr)
-            self.stdscr.addstr(height-1, len(statusbarstr), " " * (width - len(statusbarstr) - 1))
-            self.stdscr.attroff(curses.color_pair(3))
-
-            # Turning on attributes for title
-            self.stdscr.attron(curses.color_pair(1))
-            self.stdscr.attron(curses.A_BOLD)
-
-            # Rendering title
-            self.stdscr.addstr(0, start_x_title, title)
-
-            # Turning off attributes for title
-            self.stdscr.attroff(curses.color_pair(1))
-            self.stdscr.attroff(curses.A_BOLD)
-
-            # Display messages
-            for i in range(self.list_scroll, self.list_scroll + max_messages):
+            if self.search is not None:
+                statusbarstr += " | '/' to search"
+            if self.views is not None:
+                statusbarstr += " | 'v' for views"
+                if view is not None:
+                    statusbarstr += f" | 'c' for {'messages' if view.threads else 'conversations'}"
+            if metrics.enabled:
+                statusbarstr += " | 'm' for metrics"
+            if loading:
+                statusbarstr += f" | Loading... ({len(messages)})"
+            elif loader is not None and loader.error is not None:
+                statusbarstr += " | Offline, showing stored mail"
+            statusbarstr = statusbarstr[:width-1]
+
+            if self._menu_size is None:
+                # Full repaint: start from a blank screen and draw the title
+                self.stdscr.erase()
+                self._menu_size = (height, width)
+
+                shown_title = title[:width-1]
+
+                # Centering calculations
+                start_x_title = int((width // 2) - (len(shown_title) // 2) - len(shown_title) % 2)
+
+                # Rendering title
+                self.stdscr.addstr(0, start_x_title, shown_title, curses.color_pair(1) | curses.A_BOLD)
+
+            # Render status bar if it changed
+            if statusbarstr != self._drawn_status:
+                self.stdscr.addstr(height-1, 0, statusbarstr, curses.color_pair(3))
+                self.stdscr.addstr(height-1, len(statusbarstr), " " * (width - len(statusbarstr) - 1), curses.color_pair(3))
+                self._drawn_status = statusbarstr
+
+            # Let a windowed list keep just the rows around the screen in memory
+            if hasattr(messages, 'focus'):
+                messages.focus(self.list_scroll)
+
+            # Display messages, redrawing only the rows whose text or selection changed
+            today = date.today()
+            for row in range(max(0, max_messages)):
+                i = self.list_scroll + row
+                entry = None
                 if i < len(messages):
-                    message = messages[i]
-                    display_string = str(message)[:width-1]
-                    if i == self.cursor_y:
-                        self.stdscr.attron(curses.color_pair(3))
-                    self.stdscr.addstr(i - self.list_scroll + 2, 0, display_string)
-                    if i == self.cursor_y:
-                        self.stdscr.attroff(curses.color_pair(3))
+                    entry = (self._row_text(messages[i], width, today), i == self.cursor_y)
+                if self._drawn_rows.get(row) == entry:
+                    continue
+
+                self.stdscr.move(row + 2, 0)
+                self.stdscr.clrtoeol()
+                if entry is not None:
+                    display_string, selected = entry
+                    self.stdscr.addstr(row + 2, 0, display_string, curses.color_pair(3) if selected else 0)
+                self._drawn_rows[row] = entry
 
             # Refresh the screen
-            self.stdscr.refresh()
+            self.stdscr.noutrefresh()
+            curses.doupdate()
+            metrics.observe('ui.frame.menu', time.perf_counter() - frame_start)
+            if self.first_frame_at is None:
+                self.first_frame_at = time.perf_counter()
 
             # Wait for next input
             k = self.stdscr.getch()
 
-            if k == curses.KEY_DOWN:
+            if k == curses.KEY_DOWN and self.cursor_y < len(messages) - 1:
                 self.cursor_y = self.cursor_y + 1
                 if self.speak_on_scroll:
-                    self.speech.stop()
-                    self.speech.speak(messages[self.cursor_y].get_speech_summary())
-            elif k == curses.KEY_UP:
+                    self.speech.speak_summary(messages[self.cursor_y].get_speech_summary())
+            elif k == curses.KEY_UP and self.cursor_y > 0:
                 self.cursor_y = self.cursor_y - 1
                 if self.speak_on_scroll:
-                    self.speech.stop()
-                    self.speech.speak(messages[self.cursor_y].get_speech_summary())
+                    self.speech.speak_summary(messages[self.cursor_y].get_speech_summary())
 
-            self.cursor_y = max(0, self.cursor_y)
             self.cursor_y = min(len(messages) -1, self.cursor_y)
+            self.cursor_y = max(0, self.cursor_y)
+
+            if self.prefetcher is not None:
+                self.prefetcher.update(messages, self.cursor_y)
+
+            if self.speak_on_scroll and k in (curses.KEY_UP, curses.KEY_DOWN):
+                self._prerender_summaries(messages)
 
             if self.cursor_y < self.list_scroll:
                 self.list_scroll = self.cursor_y
@@ -106,9 +207,210 @@ class UI:
             if k == 10 or k == curses.KEY_ENTER:
                 if len(messages) > 0:
                     self.speech.stop()
-                    self.draw_message(messages[self.cursor_y])
+                    if isinstance(messages[self.cursor_y], Conversation):
+                        self.draw_conversation(messages[self.cursor_y])
+                    else:
+                        self.draw_message(messages[self.cursor_y])
+                    self._invalidate_menu()
             elif k == ord('t'):
                 self.speak_on_scroll = not self.speak_on_scroll
+            elif k == ord('/') and self.search is not None:
+                self.speech.stop()
+                self.draw_search()
+                self._invalidate_menu()
+                self.stdscr.timeout(100 if loading else -1)
+            elif k == ord('v') and self.views is not None:
+                self.speech.stop()
+                chosen = self.draw_views()
+                if chosen is not None:
+                    view = chosen
+                    messages, loader, title = view.messages, view.loader, view.title
+                    self.cursor_y = self.list_scroll = 0
+                    announced = False
+                    self.speech.speak(view.title)
+                self._invalidate_menu()
+            elif k == ord('c') and self.views is not None and view is not None:
+                self.speech.stop()
+                view = self.views.toggle_threads(view)
+                messages, loader, title = view.messages, view.loader, view.title
+                self.cursor_y = self.list_scroll = 0
+                announced = False
+                self.speech.speak(view.title)
+                self._invalidate_menu()
+            elif k == ord('m') and metrics.enabled:
+                self.draw_metrics()
+                self._invalidate_menu()
+
+    def draw_conversation(self, conversation):
+        """List the messages of a conversation, fetching all their bodies in one go."""
+        threading.Thread(target=conversation.load_bodies, daemon=True).start()
+        self._draw_sublist(conversation.messages,
+                           f"{conversation.subject} ({len(conversation.messages)} messages)")
+
+    def _draw_sublist(self, messages, title, loader=None):
+        """Show messages in a list of their own, then return to the current list where it was."""
+        saved = (self.cursor_y, self.list_scroll)
+        self.cursor_y = self.list_scroll = 0
+        self.draw_menu(messages, loader, title=title)
+        self.cursor_y, self.list_scroll = saved
+
+    def draw_views(self):
+        """Let the user pick a label or a Gmail query to list. Returns the View, or None."""
+        labels = self.views.labels()
+        self.views.refresh_counts()
+        k = 0
+        cursor = 0
+        top = 0
+
+        while (k != ord('q')):
+            # The user's labels are listed in the background and may arrive
+            # while the menu is open; the search row stays selected if it was
+            on_search = cursor == len(labels)
+            labels = self.views.labels()
+            if on_search:
+                cursor = len(labels)
+            # The last row asks for a Gmail search query
+            row_count = len(labels) + 1
+
+            self.stdscr.erase()
+            height, width = self.stdscr.getmaxyx()
+            visible = max(1, height - 4)
+            top = min(max(top, cursor - visible + 1), cursor)
+
+            self.stdscr.addstr(0, 0, "Views"[:width-1], curses.color_pair(1) | curses.A_BOLD)
+            counts = self.views.unread_counts()
+            for row in range(top, min(row_count, top + visible)):
+                if row < len(labels):
+                    label_id, name = labels[row]
+                    text = f"{name:<40} {counts[label_id]} unread" if label_id in counts else name
+                else:
+                    text = "Search Gmail..."
+                self.stdscr.addstr(row - top + 2, 0, text[:width-1], curses.color_pair(3) if row == cursor else 0)
+
+            loading = self.views.labels_loading() or self.views.counts_loading()
+            statusbarstr = "Press 'q' to return | Enter to open"
+            if self.views.labels_loading():
+                statusbarstr += " | Listing labels..."
+            elif self.views.counts_loading():
+                statusbarstr += " | Counting unread..."
+            statusbarstr = statusbarstr[:width-1]
+            self.stdscr.addstr(height-1, 0, statusbarstr, curses.color_pair(3))
+            self.stdscr.addstr(height-1, len(statusbarstr), " " * (width - len(statusbarstr) - 1), curses.color_pair(3))
+
+            self.stdscr.refresh()
+            self.stdscr.timeout(100 if loading else -1)
+            k = self.stdscr.getch()
+
+            if k == curses.KEY_DOWN:
+                cursor = min(cursor + 1, row_count - 1)
+            elif k == curses.KEY_UP:
+                cursor = max(cursor - 1, 0)
+            elif k == 10 or k == curses.KEY_ENTER:
+                if cursor < len(labels):
+                    return self.views.open_label(*labels[cursor])
+                query = self._prompt("Gmail search: ")
+                if query:
+                    return self.views.open_query(query)
+        return None
+
+    def draw_metrics(self):
+        """Show the recorded metrics, updated every second. 'd' writes them to a JSON file."""
+        k = 0
+        top = 0
+        status = None
+        self.stdscr.timeout(1000)
+        while (k != ord('q')):
+            self.stdscr.erase()
+            height, width = self.stdscr.getmaxyx()
+            visible = max(1, height - 4)
+            lines = metrics.report_lines()
+            top = max(0, min(top, len(lines) - visible))
+
+            self.stdscr.addstr(0, 0, "Metrics (times in ms)"[:width-1], curses.color_pair(1) | curses.A_BOLD)
+            for row, line in enumerate(lines[top:top + visible]):
+                self.stdscr.addstr(row + 2, 0, line[:width-1])
+
+            statusbarstr = status or "Press 'q' to return | 'd' to save as JSON"
+            statusbarstr = statusbarstr[:width-1]
+            self.stdscr.addstr(height-1, 0, statusbarstr, curses.color_pair(3))
+            self.stdscr.addstr(height-1, len(statusbarstr), " " * (width - len(statusbarstr) - 1), curses.color_pair(3))
+
+            self.stdscr.refresh()
+            k = self.stdscr.getch()
+
+            if k == curses.KEY_DOWN:
+                top += 1
+            elif k == curses.KEY_UP:
+                top = max(0, top - 1)
+            elif k == ord('d'):
+                try:
+                    status = f"Saved to {metrics.dump()}"
+                except OSError as error:
+                    status = f"Could not save metrics: {error}"
+        self.stdscr.timeout(-1)
+
+    def draw_search(self):
+        """Ask for a query and show the matching messages; 'q' returns to the full list.
+
+        The local matches are listed newest first, and Gmail's other matches
+        are added after them, newest first, once they arrive.
+        """
+        query = self._prompt("Search: ")
+        if not query:
+            return
+
+        self._show_status(f"Searching for {query}...")
+        results, loader = self.search(query)
+        if loader is not None and loader.is_loading():
+            self.speech.speak(f"{len(results)} messages found locally for {query}, "
+                              "more from Gmail will be added at the end")
+        else:
+            self.speech.speak(f"{len(results)} messages found for {query}")
+        self._draw_sublist(results, f"Search: {query}", loader)
+
+    def _prompt(self, prompt):
+        """Read a line of text typed on the status line. Returns '' if nothing was typed."""
+        height, width = self.stdscr.getmaxyx()
+        self._show_status(prompt)
+        self.stdscr.timeout(-1)
+        curses.echo()
+        try:
+            text = self.stdscr.getstr(height-1, len(prompt), max(1, width - len(prompt) - 1))
+        finally:
+            curses.noecho()
+        return text.decode('utf-8', 'replace').strip()
+
+    def _show_status(self, text):
+        height, width = self.stdscr.getmaxyx()
+        text = text[:width-1]
+        self.stdscr.addstr(height-1, 0, text + " " * (width - len(text) - 1), curses.color_pair(3))
+        self.stdscr.refresh()
+
+    def _prerender_summaries(self, messages):
+        """Ask the speech controller to render the summaries around the cursor ahead of time."""
+        # Nearest rows first, so the likely next ones are ready soonest
+        indexes = []
+        for distance in range(1, PRERENDER_RADIUS + 1):
+            indexes.extend((self.cursor_y + distance, self.cursor_y - distance))
+        self.speech.prerender([messages[i].get_speech_summary() for i in indexes if 0 <= i < len(messages)])
+
+    def _invalidate_menu(self):
+        """Force the next menu frame to repaint everything."""
+        self._menu_size = None
+        self._drawn_status = None
+        self._drawn_rows = {}
+
+    def _row_text(self, message, width, today):
+        """Return the list row for message, reusing it until the width or day changes."""
+        cached = self._row_cache.get(id(message))
+        if cached is not None and cached[0] is message and cached[1] == width and cached[2] == today:
+            return cached[3]
+
+        if len(self._row_cache) > ROW_CACHE_SIZE:
+            self._row_cache.clear()
+        text = str(message)[:width-1]
+        self._row_cache[id(message)] = (message, width, today, text)
+        return text
 
     def draw_message(self, message):
         k = 0
@@ -120,12 +422,23 @@ class UI:
 
         # Reset resumable speech state for new message
         self.speech.reset_resumable()
+        self._layout_key = None
 
+        if self.mark_read is not None and message.id is not None:
+            self.mark_read(message)
 
         # Loop where k is the last character pressed
         while (k != ord('q')):
+            # Nothing changes on screen while idle, so only redraw after input
+            # or while an attachment save is reporting progress
+            saving = self.attachment_saver is not None and self.attachment_saver.is_active()
+            if k == -1 and not saving:
+                k = self.stdscr.getch()
+                continue
+
             # Initialization
-            self.stdscr.clear()
+            frame_start = time.perf_counter()
+            self.stdscr.erase()
             height, width = self.stdscr.getmaxyx()
 
             # Declaration of strings
@@ -133,7 +446,13 @@ class UI:
             sender = f"From: {message.sender}"[:width-1]
             sent_date = f"Date: {message.get_date_full()}"[:width-1]
 
-            statusbarstr = f"Press 'q' to return | 's' to speak/stop | 'u' to toggle URLs | +/- to change speed (current: {self.speech_rate})"[:width-1]
+            statusbarstr = f"Press 'q' to return | 's' to speak/stop | 'u' to toggle URLs | +/- to change speed (current: {self.speech_rate})"
+            attachments = self._attachments(message)
+            if attachments:
+                statusbarstr = f"'a' for {len(attachments)} attachment(s) | " + statusbarstr
+            if saving:
+                statusbarstr = f"{self.attachment_saver.status()} | " + statusbarstr
+            statusbarstr = statusbarstr[:width-1]
 
             # Render status bar
             self.stdscr.attron(curses.color_pair(3))
@@ -155,26 +474,17 @@ class UI:
             self.stdscr.attroff(curses.color_pair(1))
             self.stdscr.attroff(curses.A_BOLD)
             
-            # TODO: handle mimetypes other than text/plain
-            body_text = message.get_body_text()
-            if not self.show_urls:
-                body_text = replace_urls(body_text, "[URL]")
-
-            
-            # Display message body
-            lines = body_text.split('\n')
-            wrapped_lines = []
-            for line in lines:
-                wrapped_lines.extend(textwrap.wrap(line, width))
-
-            for i, line in enumerate(wrapped_lines):
-                if i >= scroll_y:
-                    if i + 4 - scroll_y < height -1:
-                        self.stdscr.addstr(i + 4 - scroll_y, 0, line)
+            # Display only the visible slice of the message body
+            wrapped_lines = self._body_lines(message, width)
+            scroll_y = min(scroll_y, max(0, len(wrapped_lines) - 1))
+            body_height = max(0, height - 5)
+            for i, line in enumerate(wrapped_lines[scroll_y:scroll_y + body_height]):
+                self.stdscr.addstr(i + 4, 0, line)
 
 
             # Refresh the screen
             self.stdscr.refresh()
+            metrics.observe('ui.frame.message', time.perf_counter() - frame_start)
 
             k = self.stdscr.getch()
 
@@ -186,7 +496,7 @@ class UI:
                 is_speaking = self.speech.is_speaking()
                 debug(f"'s' pressed, is_speaking={is_speaking}")
                 if not is_speaking:
-                    text_to_speak = message.get_body_text()
+                    text_to_speak = self._body_text(message)
                     if not self.show_urls:
                         text_to_speak = replace_urls(text_to_speak, "")
 
@@ -204,6 +514,9 @@ class UI:
                 self.speech.set_rate(self.speech_rate)
             elif k == ord('u'):
                 self.show_urls = not self.show_urls
+            elif k == ord('a') and attachments:
+                self.draw_attachments(message)
+                self.stdscr.timeout(100)
 
             
             scroll_y = max(0, scroll_y)
@@ -211,3 +524,79 @@ class UI:
         self.stdscr.timeout(-1)
         if self.speech.is_speaking():
             self.speech.stop()
+
+    def _attachments(self, message):
+        """Return the attachments of message, or [] if they can't be saved."""
+        if self.attachment_saver is None or message.id is None:
+            return []
+        try:
+            return message.body.get('attachments', [])
+        except Exception:
+            # The body can't be loaded; _body_text() says why
+            return []
+
+    def _body_text(self, message):
+        """Return the body text of message, or a note saying why it can't be shown."""
+        try:
+            return message.get_body_text()
+        except OfflineError:
+            return "This message hasn't been downloaded yet. It can be read once MimiMail is back online."
+        except Exception as error:
+            debug(f"Failed to load message body: {error}")
+            return f"This message could not be loaded: {error}"
+
+    def draw_attachments(self, message):
+        """List the attachments of message; Enter saves the selected one in the background."""
+        attachments = self._attachments(message)
+        k = 0
+        cursor = 0
+        self.stdscr.timeout(100)
+
+        while (k != ord('q')):
+            self.stdscr.erase()
+            height, width = self.stdscr.getmaxyx()
+
+            title = f"Attachments: {message.subject}"[:width-1]
+            self.stdscr.addstr(0, 0, title, curses.color_pair(1) | curses.A_BOLD)
+
+            for i, attachment in enumerate(attachments[:max(0, height - 4)]):
+                row = f"{attachment['filename']:<40} {attachment['mime_type']:<30} {_format_size(attachment['size'])}"
+                self.stdscr.addstr(i + 2, 0, row[:width-1], curses.color_pair(3) if i == cursor else 0)
+
+            statusbarstr = f"Press 'q' to return | Enter to save to {self.attachment_saver.save_dir}"
+            if self.attachment_saver.status():
+                statusbarstr = f"{self.attachment_saver.status()} | " + statusbarstr
+            statusbarstr = statusbarstr[:width-1]
+            self.stdscr.addstr(height-1, 0, statusbarstr, curses.color_pair(3))
+            self.stdscr.addstr(height-1, len(statusbarstr), " " * (width - len(statusbarstr) - 1), curses.color_pair(3))
+
+            self.stdscr.refresh()
+            k = self.stdscr.getch()
+
+            if k == curses.KEY_DOWN:
+                cursor = min(cursor + 1, min(len(attachments), height - 4) - 1)
+            elif k == curses.KEY_UP:
+                cursor = max(cursor - 1, 0)
+            elif k == 10 or k == curses.KEY_ENTER:
+                self.attachment_saver.save(message.id, attachments[cursor])
+
+    def _body_lines(self, message, width):
+        """Return the message body wrapped to width.
+
+        The layout is cached and only rebuilt when the message, the screen
+        width or the URL toggle changes.
+        """
+        key = (id(message), width, self.show_urls)
+        if key != self._layout_key:
+            # TODO: handle mimetypes other than text/plain
+            body_text = self._body_text(message)
+            if not self.show_urls:
+                body_text = replace_urls(body_text, "[URL]")
+
+            wrapped_lines = []
+            for line in body_text.split('\n'):
+                wrapped_lines.extend(textwrap.wrap(line, width))
+
+            self._layout_key = key
+            self._layout_lines = wrapped_lines
+        return self._layout_lines
@@ -0,0 +1,169 @@
+"""
+MailViews - the mailbox views the message list can switch between.
+
+A view is either a label (INBOX, UNREAD, STARRED, a user label...) or an
+arbitrary Gmail search query. Label views are synced into the MessageStore
+and read back a page at a time; query views are listed by Gmail and filled
+on a background loader. Either kind can also be shown as conversations,
+one row per thread. Opened views are kept, so switching back to one shows
+what was already loaded instead of fetching it again.
+
+The user's labels and the unread counts (from labels().get(), one quota
+unit per label) are fetched in the background, so the view menu opens at
+once with the system labels and fills in as they arrive.
+"""
+
+import sys
+import threading
+import time
+
+from gmail_interface import getLabels, getUnreadCounts, iterEmails, iterThreads
+from message_list import StoredMessageList
+from message_loader import MessageLoader, StoreSyncLoader
+
+# Labels offered before the user's own, in this order
+SYSTEM_LABELS = [
+    ('INBOX', 'Inbox'),
+    ('UNREAD', 'Unread'),
+    ('STARRED', 'Starred'),
+    ('IMPORTANT', 'Important'),
+    ('SENT', 'Sent'),
+]
+
+# Opened query views kept before the oldest is dropped
+QUERY_VIEW_LIMIT = 10
+
+# Seconds before listing the user's labels is tried again after it failed
+LABELS_RETRY_INTERVAL = 60
+
+
+class View:
+    """One open view: what it selects, its message list and the loader filling it."""
+
+    def __init__(self, title, messages, loader, label_id=None, q=None, threads=False):
+        self.title = title
+        self.messages = messages
+        self.loader = loader
+        self.label_id = label_id
+        self.q = q
+        self.threads = threads
+
+
+class MailViews:
+    def __init__(self, service, store):
+        self._service = service
+        self._store = store
+        self._labels = list(SYSTEM_LABELS)
+        self._labels_done = False
+        self._labels_failed_at = None
+        self._labels_thread = None
+        # ('label', id) or ('query', q) -> View
+        self._views = {}
+        self._query_order = []
+
+        self._counts = {}
+        self._counts_lock = threading.Lock()
+        self._counts_thread = None
+        self._counts_wanted = False
+
+    def labels(self):
+        """Return (label id, name) pairs: the system labels first, then the user's labels by name.
+
+        Never waits on the network. The user's labels are listed in the
+        background on first use and show up once they have arrived; a failed
+        listing is tried again after LABELS_RETRY_INTERVAL seconds.
+        """
+        if not self._labels_done and not self.labels_loading() and (
+                self._labels_failed_at is None
+                or time.monotonic() - self._labels_failed_at >= LABELS_RETRY_INTERVAL):
+            self._labels_thread = threading.Thread(target=self._fetch_labels, daemon=True)
+            self._labels_thread.start()
+        return self._labels
+
+    def _fetch_labels(self):
+        try:
+            user_labels = [label for label in getLabels(self._service) if label.get('type') == 'user']
+        except Exception as error:
+            print(f'Failed to list labels: {error}', file=sys.stderr)
+            self._labels_failed_at = time.monotonic()
+            return
+        user_labels = sorted(((label['id'], label['name']) for label in user_labels),
+                             key=lambda label: label[1].lower())
+        self._labels = list(SYSTEM_LABELS) + user_labels
+        self._labels_done = True
+        # The counts asked for so far only covered the system labels
+        if self._counts_wanted:
+            self._fetch_counts([label_id for label_id, _ in user_labels])
+
+    def labels_loading(self):
+        return self._labels_thread is not None and self._labels_thread.is_alive()
+
+    def refresh_counts(self):
+        """Start fetching the unread count of every label in the background."""
+        self._counts_wanted = True
+        if self._counts_thread is not None and self._counts_thread.is_alive():
+            return
+        label_ids = [label_id for label_id, _ in self.labels()]
+        self._counts_thread = threading.Thread(target=self._fetch_counts, args=(label_ids,), daemon=True)
+        self._counts_thread.start()
+
+    def _fetch_counts(self, label_ids):
+        counts = getUnreadCounts(self._service, label_ids)
+        with self._counts_lock:
+            self._counts.update(counts)
+
+    def unread_counts(self):
+        """Return the unread counts fetched so far as {label id: count}."""
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def counts_loading(self):
+        return ((self._counts_thread is not None and self._counts_thread.is_alive())
+                or (self._counts_wanted and self.labels_loading()))
+
+    def open_label(self, label_id, name=None, threads=False):
+        """Return the View of a label, loading it in the background the first time.
+
+        Messages are synced into the store; conversations are listed by Gmail.
+        """
+        key = ('label', label_id, threads)
+        view = self._views.get(key)
+        if view is None:
+            title = name or label_id
+            if threads:
+                loader = MessageLoader(iterThreads(self._service, [label_id], store=self._store)).start()
+                view = View(f'{title} (conversations)', loader.messages, loader, label_id, threads=True)
+            else:
+                messages = StoredMessageList(self._store, label_id, self._service)
+                loader = StoreSyncLoader(self._service, self._store, messages, label_id).start()
+                view = View(title, messages, loader, label_id)
+            self._views[key] = view
+        return view
+
+    def open_query(self, q, threads=False):
+        """Return the View of a Gmail search query, listing it in the background the first time."""
+        key = ('query', q, threads)
+        view = self._views.get(key)
+        if view is None:
+            title = f'Search Gmail: {q}'
+            if threads:
+                loader = MessageLoader(iterThreads(self._service, None, q, store=self._store)).start()
+                view = View(f'{title} (conversations)', loader.messages, loader, q=q, threads=True)
+            else:
+                loader = MessageLoader(iterEmails(self._service, None, q, store=self._store)).start()
+                view = View(title, loader.messages, loader, q=q)
+            self._views[key] = view
+        else:
+            self._query_order.remove(key)
+        self._query_order.append(key)
+
+        while len(self._query_order) > QUERY_VIEW_LIMIT:
+            self._views.pop(self._query_order.pop(0), None)
+        return view
+
+    def toggle_threads(self, view):
+        """Return the same selection as view, as conversations if it lists messages and vice versa."""
+        name = view.title.replace(' (conversations)', '')
+        if view.q is not None:
+            return self.open_query(view.q, not view.threads)
+        return self.open_label(view.label_id, name, not view.threads)
@@ -0,0 +1,351 @@
+"""
+Benchmark of MimiMail against synthetic mailboxes of growing size.
+
+For each mailbox size, against the in-process FakeGmail service (see
+fake_gmail.py):
+
+    load     getUnreadEmails(): time and peak memory
+    sync     syncStore() into a fresh MessageStore, then an incremental sync
+    decode   _find_body_parts(), _decode_body() (HTML conversion included)
+             and replace_urls() per message
+    message  Message construction, row and speech strings per message
+    render   per-frame time of UI.draw_menu() scrolling the list and of
+             UI.draw_message() scrolling a newsletter, on a headless screen
+
+Results are printed as a table and written as JSON, so runs on different
+commits can be compared with --compare.
+
+    python benchmarks/bench_mailbox.py [--sizes 100 1000 10000 100000]
+        [--latency SECONDS] [--error-rate RATE] [--output FILE] [--compare FILE]
+"""
+
+import argparse
+import curses
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'MimiMail'))
+
+import gmail_interface
+from fake_gmail import FakeGmail, SyntheticMailbox
+from fetch_executor import FetchExecutor
+from gmail_interface import (_decode_body, _find_body_parts, _message_from_json, getUnreadEmails,
+                             replace_urls, syncStore)
+from message_store import MessageStore
+from Message import Message
+from ui import UI
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+
+# Messages decoded per mailbox size; decoding is per message, so a sample is enough
+DECODE_SAMPLE = 2000
+
+# Frames drawn per render measurement
+FRAMES = 200
+
+SCREEN_HEIGHT = 50
+SCREEN_WIDTH = 160
+
+
+class HeadlessScreen:
+    """A curses window that draws nowhere and replays a fixed list of keys.
+
+    The time between one getch() and the next is the time the UI took to
+    handle a key and draw the following frame.
+    """
+
+    def __init__(self, keys, height=SCREEN_HEIGHT, width=SCREEN_WIDTH):
+        self._keys = list(reversed(keys))
+        self._height = height
+        self._width = width
+        self._last = None
+        self.frame_times = []
+
+    def getch(self):
+        now = time.perf_counter()
+        if self._last is not None:
+            self.frame_times.append(now - self._last)
+        if not self._keys:
+            return ord('q')
+        key = self._keys.pop()
+        self._last = time.perf_counter()
+        return key
+
+    def getmaxyx(self):
+        return self._height, self._width
+
+    def addstr(self, y, x, text, attr=0):
+        if not 0 <= y < self._height or x + len(text) > self._width:
+            raise curses.error('addstr() returned ERR')
+
+    def getstr(self, y, x, n):
+        return b''
+
+    def _noop(self, *args):
+        pass
+
+    clear = erase = refresh = noutrefresh = timeout = move = clrtoeol = attron = attroff = _noop
+
+
+class SilentSpeech:
+    """SpeechController stand-in that only counts what it is asked to say."""
+
+    def __init__(self):
+        self.spoken = 0
+
+    def speak(self, text, resumable=False):
+        self.spoken += 1
+
+    speak_summary = speak
+
+    def prerender(self, texts):
+        pass
+
+    def stop(self):
+        pass
+
+    def is_speaking(self):
+        return False
+
+    def reset_resumable(self):
+        pass
+
+    def set_rate(self, rate):
+        pass
+
+
+def headless_curses():
+    """Replace the curses calls the UI makes outside its window with no-ops."""
+    for name in ('start_color', 'init_pair', 'doupdate', 'echo', 'noecho', 'curs_set'):
+        setattr(curses, name, lambda *args: None)
+    curses.color_pair = lambda number: number << 8
+
+
+def summarize(times):
+    """Return mean, p50, p95 and max of a list of seconds, in milliseconds."""
+    if not times:
+        return {}
+    times = sorted(times)
+    return {
+        'mean_ms': sum(times) / len(times) * 1000,
+        'p50_ms': times[len(times) // 2] * 1000,
+        'p95_ms': times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+        'max_ms': times[-1] * 1000,
+    }
+
+
+def new_service(mailbox, args):
+    service = FakeGmail(mailbox, latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    # A fresh executor per run, so stats and adaptive concurrency start over
+    gmail_interface._executor = FetchExecutor(quota_per_second=args.quota, base_delay=args.retry_delay)
+    return service
+
+
+def bench_load(mailbox, args):
+    service = new_service(mailbox, args)
+    start = time.perf_counter()
+    messages = getUnreadEmails(service)
+    result = {'seconds': time.perf_counter() - start, 'messages': len(messages),
+              'round_trips': service.round_trips, 'injected_errors': service.errors,
+              'executor': gmail_interface.get_executor().stats()}
+
+    if args.memory:
+        # Traced separately, so tracing does not slow the timed load
+        service = new_service(mailbox, args)
+        tracemalloc.start()
+        getUnreadEmails(service)
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result['bytes_per_message'] = result['peak_bytes'] / max(1, len(messages))
+    return result, messages
+
+
+def bench_sync(mailbox, args):
+    service = new_service(mailbox, args)
+    with tempfile.TemporaryDirectory() as directory:
+        store = MessageStore(os.path.join(directory, 'bench.db'))
+        start = time.perf_counter()
+        syncStore(service, store)
+        full = time.perf_counter() - start
+
+        service.add_messages(max(1, mailbox.count // 100))
+        start = time.perf_counter()
+        syncStore(service, store)
+        incremental = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rows = store.list_headers('INBOX')
+        list_seconds = time.perf_counter() - start
+        store.close()
+    return {'full_seconds': full, 'incremental_seconds': incremental, 'list_seconds': list_seconds,
+            'rows': len(rows)}
+
+
+def bench_decode(mailbox, args):
+    count = min(mailbox.count, args.decode_sample)
+    resources = [mailbox.resource(index) for index in range(count)]
+
+    start = time.perf_counter()
+    for resource in resources:
+        _find_body_parts(resource['payload'])
+    find_parts = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bodies = [_decode_body(resource['payload']) for resource in resources]
+    decode = time.perf_counter() - start
+
+    texts = [body.get('data', '') for body in bodies]
+    start = time.perf_counter()
+    for text in texts:
+        replace_urls(text, '[URL]')
+    urls = time.perf_counter() - start
+
+    return {
+        'messages': count,
+        'find_body_parts_us': find_parts / count * 1e6,
+        'decode_body_us': decode / count * 1e6,
+        'replace_urls_us': urls / count * 1e6,
+        'body_chars': sum(len(text) for text in texts) / count,
+    }
+
+
+def bench_message(mailbox, args):
+    rows = []
+    for index in range(mailbox.count):
+        headers = {header['name']: header['value'] for header in mailbox.headers(index)}
+        rows.append((headers['From'], headers['Date'], headers['Subject'], mailbox.message_id(index)))
+
+    start = time.perf_counter()
+    messages = [Message(sender, sent_date, subject, {}, message_id)
+                for sender, sent_date, subject, message_id in rows]
+    construct = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message in messages:
+        str(message)
+        message.get_speech_summary()
+    strings = time.perf_counter() - start
+
+    return {'construct_us': construct / len(rows) * 1e6, 'strings_us': strings / len(rows) * 1e6}
+
+
+def bench_render(messages, mailbox, args):
+    # Scroll to the end of the screen and well past it, then back up
+    keys = [curses.KEY_DOWN] * (args.frames * 3 // 4) + [curses.KEY_UP] * (args.frames // 4)
+    screen = HeadlessScreen(keys)
+    ui = UI(screen, SilentSpeech())
+    ui.draw_menu(messages)
+    result = {'menu': summarize(screen.frame_times)}
+
+    newsletter = next((index for index in range(mailbox.count) if mailbox.kind(index) == 'newsletter'), None)
+    if newsletter is not None:
+        message = _message_from_json(mailbox.resource(newsletter))
+        # Scroll through the body, showing and hiding URLs now and then
+        keys = [ord('u') if i % 20 == 19 else curses.KEY_DOWN for i in range(args.frames)]
+        screen = HeadlessScreen(keys)
+        ui = UI(screen, SilentSpeech())
+        ui.draw_message(message)
+        result['message'] = summarize(screen.frame_times)
+    return result
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=''):
+    """Yield (dotted name, value) for every number in a nested results dict."""
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            yield from flatten(value, name + '.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(old, new):
+    """Print each metric of two result files side by side."""
+    old_values = dict(flatten(old['results']))
+    common = [(name, value) for name, value in flatten(new['results']) if old_values.get(name)]
+    if not common:
+        print('Nothing to compare: the runs have no mailbox sizes in common')
+        return
+    print(f"\n{'':<50}{old.get('commit') or 'old':>14}{new.get('commit') or 'new':>14}{'ratio':>8}")
+    for name, value in common:
+        print(f'{name:<50}{old_values[name]:>14.3f}{value:>14.3f}{value / old_values[name]:>8.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per HTTP round trip')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls failing with 429 or 500')
+    parser.add_argument('--quota', type=float, default=1e9,
+                        help='quota units per second; 250 to include Gmail throttling')
+    parser.add_argument('--retry-delay', type=float, default=0.01, help='base retry backoff in seconds')
+    parser.add_argument('--decode-sample', type=int, default=DECODE_SAMPLE)
+    parser.add_argument('--frames', type=int, default=FRAMES)
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='skip peak memory tracing')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON results file (default benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='earlier JSON results file to compare with')
+    args = parser.parse_args()
+
+    headless_curses()
+    report = {
+        'commit': commit(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'results': {},
+    }
+
+    print(f"{'messages':>9}{'load s':>9}{'peak MB':>9}{'sync s':>9}{'incr s':>9}{'decode us':>11}"
+          f"{'urls us':>9}{'row us':>8}{'menu ms':>9}{'body ms':>9}")
+    for size in args.sizes:
+        mailbox = SyntheticMailbox(size, seed=args.seed)
+        load, messages = bench_load(mailbox, args)
+        results = {
+            'load': load,
+            'sync': bench_sync(mailbox, args),
+            'decode': bench_decode(mailbox, args),
+            'message': bench_message(mailbox, args),
+            'render': bench_render(messages, mailbox, args),
+        }
+        del messages
+        report['results'][str(size)] = results
+
+        peak = load.get('peak_bytes')
+        print(f"{size:>9}{load['seconds']:>9.2f}{peak / 2 ** 20 if peak else float('nan'):>9.1f}"
+              f"{results['sync']['full_seconds']:>9.2f}{results['sync']['incremental_seconds']:>9.2f}"
+              f"{results['decode']['decode_body_us']:>11.1f}{results['decode']['replace_urls_us']:>9.1f}"
+              f"{results['message']['construct_us'] + results['message']['strings_us']:>8.1f}"
+              f"{results['render']['menu'].get('mean_ms', 0):>9.3f}"
+              f"{results['render'].get('message', {}).get('mean_ms', 0):>9.3f}", flush=True)
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"{report['commit'] or 'latest'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
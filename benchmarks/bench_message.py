@@ -0,0 +1,124 @@
+"""
+Microbenchmark for per-row Message cost in the message list.
+
+Compares the original eager dataclass Message with the current slotted,
+lazily parsed one: construction, then the strings the UI asks for on every
+frame (str() for the row and the speech summary on cursor moves), and the
+memory each drawn row holds on to.
+
+    python benchmarks/bench_message.py [rows] [frames]
+"""
+
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from email.utils import parsedate_tz, mktime_tz, formatdate
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'MimiMail'))
+
+from Message import Message
+
+
+@dataclass
+class LegacyMessage:
+    """Message as it was before it was made compact, kept for comparison."""
+    sender: str
+    sent_date: str
+    subject: str
+    body: dict
+
+    def __post_init__(self):
+        self.sent_date = time.localtime(mktime_tz(parsedate_tz(self.sent_date)))
+
+    def get_sender_name(self):
+        if '<' in self.sender:
+            return self.sender.split('<')[0].strip(' "')
+        return self.sender
+
+    def get_date_for_display(self):
+        now = datetime.now()
+        message_date = datetime.fromtimestamp(time.mktime(self.sent_date))
+
+        if message_date.date() == now.date():
+            return "Today"
+        elif now.year == message_date.year:
+            if now.isocalendar()[1] == message_date.isocalendar()[1] and now.weekday() >= message_date.weekday():
+                return time.strftime("%a", self.sent_date)
+            else:
+                return time.strftime("%b %d", self.sent_date)
+        else:
+            return time.strftime("%b %d, %Y", self.sent_date)
+
+    def get_date_for_speech(self):
+        now = datetime.now()
+        message_date = datetime.fromtimestamp(time.mktime(self.sent_date))
+
+        if message_date.date() == now.date():
+            return "Today"
+        elif now.year == message_date.year:
+            if now.isocalendar()[1] == message_date.isocalendar()[1] and now.weekday() >= message_date.weekday():
+                return time.strftime("%A", self.sent_date)
+            else:
+                return time.strftime("%B %d", self.sent_date)
+        else:
+            return time.strftime("%B %d, %Y", self.sent_date)
+
+    def get_speech_summary(self):
+        return f"From: {self.get_sender_name()}, Subject: {self.subject}. Message received on {self.get_date_for_speech()}"
+
+    def __repr__(self):
+        return f'{self.get_date_for_display():<10} From:{self.sender:<25} Subject:{self.subject}'
+
+
+def make_rows(count):
+    now = time.time()
+    # Spread over two years so every date format is exercised
+    return [(f'Sender {i} <sender{i}@example.com>', formatdate(now - i * 7919, localtime=True), f'Subject {i}')
+            for i in range(count)]
+
+
+def bench(cls, rows, frames):
+    """Return (construct, frame) seconds per row for cls."""
+    construct = timeit.timeit(lambda: [cls(s, d, subj, {}) for s, d, subj in rows], number=1)
+    messages = [cls(s, d, subj, {}) for s, d, subj in rows]
+
+    def frame():
+        for message in messages:
+            str(message)
+            message.get_speech_summary()
+
+    frame_time = timeit.timeit(frame, number=frames) / frames
+    return construct / len(rows), frame_time / len(rows)
+
+
+def memory_per_row(cls, rows):
+    """Bytes allocated per row for messages that have been drawn once."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages = [cls(s, d, subj, {}) for s, d, subj in rows]
+    for message in messages:
+        str(message)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(messages)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rows = make_rows(count)
+
+    print(f'{count} rows, {frames} frames (microseconds per row)')
+    print(f'{"":<10}{"construct":>12}{"per frame":>12}{"bytes":>8}')
+    for name, cls in (('before', LegacyMessage), ('after', Message)):
+        construct, frame = bench(cls, rows, frames)
+        size = memory_per_row(cls, rows)
+        print(f'{name:<10}{construct * 1e6:>12.2f}{frame * 1e6:>12.2f}{size:>8.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,524 @@
+"""
+In-process stand-in for the Gmail API service, over a synthetic mailbox.
+
+FakeGmail answers the calls MimiMail makes through
+service.users().messages()/threads()/history()/labels(), including batch
+requests. Every HTTP round trip sleeps for the configured latency. Calls,
+and items inside a batch, fail with 429 or 500 at the configured error rate.
+
+SyntheticMailbox builds each message from its index on demand, so even a
+100k-message mailbox takes almost no memory of its own, and peak memory
+measured while loading belongs to the client. The mix has plain-text
+mail, multipart/alternative mail, HTML newsletters with nested
+multipart/related trees, link-heavy bodies, attachments, and a share of
+ISO-8859-1 text.
+"""
+
+import base64
+import json
+import random
+import threading
+import time
+from email.utils import formatdate
+
+from googleapiclient.errors import HttpError
+
+# Message kinds and how often each occurs
+KINDS = [
+    ('plain', 40),
+    ('alternative', 25),
+    ('newsletter', 20),
+    ('links', 10),
+    ('attachment', 5),
+]
+
+# Ids messages().list() and threads().list() return per page, as Gmail does by default
+PAGE_SIZE = 100
+
+# Most requests Gmail accepts in one batch
+MAX_BATCH_SIZE = 100
+
+SYSTEM_LABELS = ['INBOX', 'UNREAD', 'STARRED', 'IMPORTANT', 'SENT', 'CATEGORY_PROMOTIONS']
+
+WORDS = ('the meeting agenda update project report quarterly budget review team schedule '
+         'please find attached notes draft proposal customer feedback release launch deadline '
+         'invoice payment account security newsletter weekly offer sale discount member event '
+         'café résumé naïve señor').split()
+
+NAMES = ['Alice Example', 'Bob Sender', 'Carol Newsletter', 'Dave Ops', 'Eve Billing',
+         'Frank Support', 'Grace Hopper', 'Heidi Shop', 'Ivan Travel', 'Judy Team']
+
+_ERRORS = {
+    404: {'error': {'code': 404, 'message': 'Requested entity was not found.',
+                    'errors': [{'reason': 'notFound', 'message': 'Requested entity was not found.'}]}},
+    429: {'error': {'code': 429, 'message': 'Rate Limit Exceeded',
+                    'errors': [{'reason': 'rateLimitExceeded', 'message': 'Rate Limit Exceeded'}]}},
+    500: {'error': {'code': 500, 'message': 'Backend Error',
+                    'errors': [{'reason': 'backendError', 'message': 'Backend Error'}]}},
+}
+
+
+def _b64(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+class _Response(dict):
+    """Stands in for the httplib2 response an HttpError carries."""
+
+    def __init__(self, status):
+        super().__init__(status=str(status))
+        self.status = status
+        self.reason = _ERRORS[status]['error']['message']
+
+
+def http_error(status):
+    return HttpError(_Response(status), json.dumps(_ERRORS[status]).encode('utf-8'))
+
+
+class SyntheticMailbox:
+    """A deterministic mailbox of count messages, newest first.
+
+    Message i is rebuilt from (seed, i) whenever it is asked for. Threads
+    are runs of one to five consecutive messages.
+    """
+
+    def __init__(self, count, seed=0, now=None):
+        self.count = count
+        self.seed = seed
+        self.now = time.time() if now is None else now
+        self._kinds = [kind for kind, weight in KINDS for _ in range(weight)]
+
+        # Thread id of each message, and the messages of each thread
+        self.thread_ids = []
+        self.threads = {}
+        rng = random.Random(seed)
+        i = 0
+        while i < count:
+            size = min(count - i, rng.randint(1, 5))
+            thread_id = f'{0x18000000000 + i:x}'
+            self.threads[thread_id] = list(range(i, i + size))
+            self.thread_ids.extend([thread_id] * size)
+            i += size
+
+        # Labels changed since the mailbox was built, by index
+        self._labels = {}
+
+    def message_id(self, index):
+        return f'{0x19000000000 + index:x}'
+
+    def index(self, message_id):
+        return int(message_id, 16) - 0x19000000000
+
+    def _rng(self, index):
+        return random.Random(self.seed * 1000003 + index)
+
+    def kind(self, index):
+        return self._rng(index).choice(self._kinds)
+
+    def labels(self, index):
+        labels = self._labels.get(index)
+        if labels is not None:
+            return labels
+        rng = self._rng(index)
+        kind = rng.choice(self._kinds)
+        labels = ['INBOX'] if rng.random() < 0.9 else ['SENT']
+        if rng.random() < 0.3:
+            labels.append('UNREAD')
+        if rng.random() < 0.05:
+            labels.append('STARRED')
+        if kind == 'newsletter':
+            labels.append('CATEGORY_PROMOTIONS')
+        return labels
+
+    def set_labels(self, index, labels):
+        self._labels[index] = list(labels)
+
+    def internal_date(self, index):
+        # About two years of mail, newest first, so every date format is drawn
+        return int((self.now - index * (2 * 365 * 86400 / max(self.count, 1)) - 60) * 1000)
+
+    def headers(self, index):
+        rng = self._rng(index)
+        name = NAMES[index % len(NAMES)]
+        sender = f'{name} <{name.split()[0].lower()}{index % 97}@example.com>'
+        subject = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 9))).capitalize()
+        if index > 0 and self.thread_ids[index] == self.thread_ids[index - 1]:
+            subject = 'Re: ' + subject
+        return [
+            {'name': 'From', 'value': sender},
+            {'name': 'To', 'value': 'me@example.com'},
+            {'name': 'Subject', 'value': subject},
+            {'name': 'Date', 'value': formatdate(self.internal_date(index) / 1000, localtime=True)},
+            {'name': 'Message-ID', 'value': f'<{self.message_id(index)}@example.com>'},
+        ]
+
+    def _text(self, rng, words):
+        lines = []
+        line = []
+        for _ in range(words):
+            line.append(rng.choice(WORDS))
+            if len(line) >= rng.randint(8, 14):
+                lines.append(' '.join(line))
+                line = []
+                if rng.random() < 0.2:
+                    lines.append('')
+        lines.append(' '.join(line))
+        return '\n'.join(lines)
+
+    def _url(self, rng):
+        path = '/'.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        return (f'https://click.example.com/{path}?utm_source=newsletter&utm_medium=email'
+                f'&id={rng.randint(0, 10 ** 9)}&sig={rng.getrandbits(64):x}')
+
+    def _html(self, rng, sections):
+        rows = []
+        for _ in range(sections):
+            rows.append(
+                '<tr><td style="padding:12px;font-family:Arial,sans-serif">'
+                f'<h2 style="margin:0">{self._text(rng, 6)}</h2>'
+                f'<p>{self._text(rng, rng.randint(30, 80))}</p>'
+                f'<a href="{self._url(rng)}" style="color:#1a73e8">Read more &raquo;</a>'
+                f'<img src="cid:img{len(rows)}" width="600" alt="">'
+                '</td></tr>')
+        return ('<!DOCTYPE html><html><head><style>td{color:#333}</style></head><body>'
+                '<table width="100%" cellpadding="0" cellspacing="0">' + ''.join(rows) +
+                f'<tr><td><small>You are receiving this email because you signed up. '
+                f'<a href="{self._url(rng)}">Unsubscribe</a></small></td></tr></table></body></html>')
+
+    @staticmethod
+    def _part(part_id, mime_type, data, charset='utf-8'):
+        encoded = data.encode(charset, 'replace')
+        return {'partId': part_id, 'mimeType': mime_type, 'filename': '',
+                'headers': [{'name': 'Content-Type', 'value': f'{mime_type}; charset="{charset}"'}],
+                'body': {'size': len(encoded), 'data': _b64(encoded)}}
+
+    def payload(self, index):
+        """Return the format=full payload of message index."""
+        rng = self._rng(index)
+        kind = rng.choice(self._kinds)
+        charset = 'iso-8859-1' if rng.random() < 0.1 else 'utf-8'
+        headers = self.headers(index)
+
+        if kind == 'plain':
+            payload = self._part('', 'text/plain', self._text(rng, rng.randint(40, 400)), charset)
+        elif kind == 'links':
+            text = '\n'.join(f'{self._text(rng, rng.randint(4, 12))}\n{self._url(rng)}'
+                             for _ in range(rng.randint(20, 60)))
+            payload = self._part('', 'text/plain', text, charset)
+        elif kind == 'alternative':
+            text = self._text(rng, rng.randint(60, 300))
+            html = '<html><body>' + ''.join(f'<p>{line}</p>' for line in text.split('\n')) + '</body></html>'
+            payload = {'partId': '', 'mimeType': 'multipart/alternative', 'filename': '',
+                       'body': {'size': 0},
+                       'parts': [self._part('0', 'text/plain', text, charset),
+                                 self._part('1', 'text/html', html, charset)]}
+        elif kind == 'newsletter':
+            sections = rng.randint(4, 20)
+            images = [{'partId': f'1.{n}', 'mimeType': 'image/png', 'filename': f'img{n}.png',
+                       'headers': [{'name': 'Content-ID', 'value': f'<img{n}>'}],
+                       'body': {'size': rng.randint(2000, 40000), 'attachmentId': f'ANGjdJ{index:x}i{n}'}}
+                      for n in range(min(sections, 4))]
+            payload = {'partId': '', 'mimeType': 'multipart/related', 'filename': '',
+                       'body': {'size': 0},
+                       'parts': [self._part('0', 'text/html', self._html(rng, sections), charset)] + images}
+        else:
+            text = self._text(rng, rng.randint(40, 200))
+            html = '<html><body>' + ''.join(f'<p>{line}</p>' for line in text.split('\n')) + '</body></html>'
+            alternative = {'partId': '0', 'mimeType': 'multipart/alternative', 'filename': '',
+                           'body': {'size': 0},
+                           'parts': [self._part('0.0', 'text/plain', text, charset),
+                                     self._part('0.1', 'text/html', html, charset)]}
+            attachment = {'partId': '1', 'mimeType': 'application/pdf', 'filename': f'report-{index}.pdf',
+                          'headers': [{'name': 'Content-Disposition',
+                                       'value': f'attachment; filename="report-{index}.pdf"'}],
+                          'body': {'size': rng.randint(20000, 2000000), 'attachmentId': f'ANGjdJ{index:x}a'}}
+            payload = {'partId': '', 'mimeType': 'multipart/mixed', 'filename': '',
+                       'body': {'size': 0}, 'parts': [alternative, attachment]}
+
+        payload['headers'] = headers + payload.get('headers', [])
+        return payload
+
+    def resource(self, index, format='full', metadata_headers=None):
+        """Return message index as messages().get() would with format."""
+        message = {'id': self.message_id(index), 'threadId': self.thread_ids[index],
+                   'labelIds': self.labels(index), 'historyId': str(1000 + self.count - index),
+                   'internalDate': str(self.internal_date(index)), 'snippet': '', 'sizeEstimate': 0}
+        if format == 'minimal':
+            return message
+        if format == 'metadata':
+            headers = self.headers(index)
+            if metadata_headers:
+                headers = [header for header in headers if header['name'] in metadata_headers]
+            message['payload'] = {'mimeType': 'multipart/mixed', 'headers': headers}
+            return message
+        if format == 'full':
+            message['payload'] = self.payload(index)
+            return message
+        raise ValueError(f'format {format!r} is not supported by the fake service')
+
+
+class _Request:
+    def __init__(self, service, method_id, fn):
+        self._service = service
+        self._fn = fn
+        self.methodId = method_id
+        self.http = None
+
+    def execute(self, http=None, num_retries=0):
+        self._service._round_trip()
+        return self._fn()
+
+
+class _Batch:
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self._requests) >= MAX_BATCH_SIZE:
+            raise ValueError(f'a batch holds at most {MAX_BATCH_SIZE} requests')
+        self._requests.append((request_id or str(len(self._requests)), request, callback))
+
+    def execute(self, http=None):
+        self._service._round_trip(batch=True)
+        for request_id, request, callback in self._requests:
+            try:
+                self._service._maybe_fail()
+                response, error = request._fn(), None
+            except HttpError as exception:
+                response, error = None, exception
+            (callback or self._callback)(request_id, response, error)
+
+
+class FakeGmail:
+    """The service object; also answers users() and the resource methods below it."""
+
+    def __init__(self, mailbox, latency=0.0, error_rate=0.0, seed=0):
+        self.mailbox = mailbox
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.round_trips = 0
+        self.errors = 0
+
+        self.history_id = 1000 + mailbox.count
+        # (history id, record) for changes made with add_messages()
+        self._history = []
+        self._added = []
+        # Matching ids or thread ids by (resource, labelIds, q), until the mailbox changes
+        self._listings = {}
+
+    def _round_trip(self, batch=False):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if not batch:
+            self._maybe_fail()
+
+    def _maybe_fail(self):
+        if not self.error_rate:
+            return
+        with self._lock:
+            failed = self._rng.random() < self.error_rate
+            status = self._rng.choice((429, 500))
+            if failed:
+                self.errors += 1
+        if failed:
+            raise http_error(status)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return _Messages(self)
+
+    def threads(self):
+        return _Threads(self)
+
+    def history(self):
+        return _History(self)
+
+    def labels(self):
+        return _Labels(self)
+
+    def getProfile(self, userId='me'):
+        return _Request(self, 'gmail.users.getProfile',
+                        lambda: {'emailAddress': 'me@example.com', 'historyId': str(self.history_id)})
+
+    # Mailbox access shared by the resources
+
+    def _ids(self):
+        return list(reversed(self._added)) + list(range(self.mailbox.count))
+
+    def _listing(self, resource, label_ids, q):
+        """Return the matching message indexes or thread ids, newest first.
+
+        Kept between pages, so listing a mailbox page by page stays linear.
+        """
+        key = (resource, tuple(label_ids or ()), q)
+        items = self._listings.get(key)
+        if items is None:
+            if resource == 'messages':
+                items = [index for index in self._ids() if self._matches(index, label_ids, q)]
+            else:
+                items = [thread_id for thread_id, indexes in self.mailbox.threads.items()
+                         if any(self._matches(index, label_ids, q) for index in indexes)]
+            self._listings[key] = items
+        return items
+
+    def _matches(self, index, label_ids, q):
+        if label_ids and not set(label_ids) <= set(self.mailbox.labels(index)):
+            return False
+        if q:
+            headers = {header['name']: header['value'] for header in self.mailbox.headers(self._source(index))}
+            text = f"{headers['From']} {headers['Subject']}".lower()
+            return all(word in text for word in q.lower().split() if ':' not in word)
+        return True
+
+    def _page(self, items, page_token, max_results):
+        start = int(page_token or 0)
+        end = start + (max_results or PAGE_SIZE)
+        page = {'resultSizeEstimate': len(items)}
+        if end < len(items):
+            page['nextPageToken'] = str(end)
+        return items[start:end], page
+
+    def add_messages(self, count):
+        """Deliver count new INBOX messages, recorded in history for an incremental sync.
+
+        They reuse the content of existing messages, relabelled and with new ids.
+        """
+        for _ in range(count):
+            index = self.mailbox.count + len(self._added)
+            self._added.append(index)
+            self.mailbox.set_labels(index, ['INBOX', 'UNREAD'])
+            self.history_id += 1
+            message = {'id': self.mailbox.message_id(index), 'threadId': self._thread_id(index),
+                       'labelIds': ['INBOX', 'UNREAD']}
+            self._history.append((self.history_id, {'id': str(self.history_id), 'messagesAdded': [
+                {'message': message}]}))
+        self._listings.clear()
+
+    def _source(self, index):
+        """Return the mailbox index whose content message index shows."""
+        return index % self.mailbox.count if index >= self.mailbox.count else index
+
+    def _thread_id(self, index):
+        # Added messages each start a thread of their own
+        if index >= self.mailbox.count:
+            return f'{index:x}'
+        return self.mailbox.thread_ids[index]
+
+    def _resource(self, index, format, metadata_headers=None):
+        message = self.mailbox.resource(self._source(index), format, metadata_headers)
+        if index >= self.mailbox.count:
+            message['id'] = self.mailbox.message_id(index)
+            message['threadId'] = self._thread_id(index)
+            message['labelIds'] = self.mailbox.labels(index)
+            message['internalDate'] = str(int(time.time() * 1000))
+        return message
+
+
+class _Messages:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId='me', labelIds=None, q=None, pageToken=None, maxResults=None, **kwargs):
+        service = self._service
+
+        def fn():
+            items, page = service._page(service._listing('messages', labelIds, q), pageToken, maxResults)
+            page['messages'] = [{'id': service.mailbox.message_id(index), 'threadId': service._thread_id(index)}
+                                for index in items]
+            return page
+        return _Request(service, 'gmail.users.messages.list', fn)
+
+    def get(self, userId='me', id=None, format='full', metadataHeaders=None, **kwargs):
+        service = self._service
+
+        def fn():
+            index = service.mailbox.index(id)
+            if not 0 <= index < service.mailbox.count + len(service._added):
+                raise http_error(404)
+            return service._resource(index, format, metadataHeaders)
+        return _Request(service, 'gmail.users.messages.get', fn)
+
+    def batchModify(self, userId='me', body=None):
+        service = self._service
+
+        def fn():
+            for message_id in body['ids']:
+                index = service.mailbox.index(message_id)
+                labels = set(service.mailbox.labels(index))
+                labels |= set(body.get('addLabelIds', []))
+                labels -= set(body.get('removeLabelIds', []))
+                service.mailbox.set_labels(index, sorted(labels))
+            service._listings.clear()
+            return {}
+        return _Request(service, 'gmail.users.messages.batchModify', fn)
+
+
+class _Threads:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId='me', labelIds=None, q=None, pageToken=None, maxResults=None, **kwargs):
+        service = self._service
+
+        def fn():
+            items, page = service._page(service._listing('threads', labelIds, q), pageToken, maxResults)
+            page['threads'] = [{'id': thread_id, 'snippet': ''} for thread_id in items]
+            return page
+        return _Request(service, 'gmail.users.threads.list', fn)
+
+    def get(self, userId='me', id=None, format='full', metadataHeaders=None, **kwargs):
+        service = self._service
+
+        def fn():
+            # Gmail lists a thread's messages oldest first
+            indexes = sorted(service.mailbox.threads[id], reverse=True)
+            return {'id': id, 'messages': [service._resource(index, format, metadataHeaders)
+                                           for index in indexes]}
+        return _Request(service, 'gmail.users.threads.get', fn)
+
+
+class _History:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId='me', startHistoryId=None, pageToken=None, **kwargs):
+        service = self._service
+
+        def fn():
+            start = int(startHistoryId)
+            if start < 1000 + service.mailbox.count:
+                raise http_error(404)
+            records = [record for history_id, record in service._history if history_id > start]
+            return {'history': records, 'historyId': str(service.history_id)}
+        return _Request(service, 'gmail.users.history.list', fn)
+
+
+class _Labels:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId='me'):
+        return _Request(self._service, 'gmail.users.labels.list', lambda: {'labels': [
+            {'id': label_id, 'name': label_id, 'type': 'system'} for label_id in SYSTEM_LABELS]})
+
+    def get(self, userId='me', id=None):
+        service = self._service
+
+        def fn():
+            unread = sum(1 for index in range(service.mailbox.count)
+                         if {id, 'UNREAD'} <= set(service.mailbox.labels(index)))
+            return {'id': id, 'name': id, 'messagesUnread': unread}
+        return _Request(service, 'gmail.users.labels.get', fn)
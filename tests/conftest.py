@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules under test import each other by plain name, as when mutt_main runs
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'MimiMail'))
@@ -0,0 +1,32 @@
+"""Tests of decoding raw (format=raw) message bodies."""
+
+import base64
+
+import pytest
+
+pytest.importorskip('googleapiclient')
+
+from gmail_interface import _body_from_resource
+
+
+def _raw(message):
+    return {'raw': base64.urlsafe_b64encode(message.encode('latin-1')).decode('ascii').rstrip('=')}
+
+
+def test_declared_charset_is_used():
+    message = _raw('Content-Type: text/plain; charset=iso-8859-1\r\n'
+                   'Content-Transfer-Encoding: 8bit\r\n\r\ncaf\xe9\r\n')
+    assert _body_from_resource(message, 'raw')['data'].strip() == 'caf\xe9'
+
+
+def test_unknown_charset_falls_back_to_utf8():
+    message = _raw('Content-Type: text/plain; charset=x-unknown-cs\r\n\r\nhello there\r\n')
+    assert _body_from_resource(message, 'raw')['data'].strip() == 'hello there'
+
+
+def test_unknown_charset_in_html_part():
+    message = _raw('MIME-Version: 1.0\r\n'
+                   'Content-Type: multipart/alternative; boundary="b"\r\n\r\n'
+                   '--b\r\nContent-Type: text/html; charset=x-unknown-cs\r\n\r\n'
+                   '<p>hello <b>there</b></p>\r\n--b--\r\n')
+    assert 'hello' in _body_from_resource(message, 'raw')['data']
@@ -0,0 +1,69 @@
+"""Tests of ChangeReplayer's last replay on stop()."""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('googleapiclient')
+
+import message_loader
+from message_loader import ChangeReplayer
+from message_store import MessageStore
+
+
+class Service:
+    def __init__(self, online=True):
+        self.online = online
+
+    def is_online(self):
+        return self.online
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MessageStore(str(tmp_path / 'store.db'))
+    yield store
+    store.close()
+
+
+def test_changes_queued_during_a_replay_are_sent_on_stop(store, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    sent = []
+
+    def replay(service, store):
+        changes = store.pending_label_changes()
+        if not sent:
+            started.set()
+            release.wait(2)
+        for (label_id, added), message_ids in changes.items():
+            sent.extend(message_ids)
+            store.clear_label_changes(message_ids, label_id, added)
+    monkeypatch.setattr(message_loader, 'replayChanges', replay)
+
+    store.queue_label_change('first', 'UNREAD', added=False)
+    replayer = ChangeReplayer(Service(), store, interval=60).start()
+    assert started.wait(2)
+    store.queue_label_change('second', 'UNREAD', added=False)
+    threading.Timer(0.05, release.set).start()
+    replayer.stop()
+
+    assert sent == ['first', 'second']
+    assert not store.pending_label_changes()
+
+
+def test_stop_does_not_wait_while_offline(store, monkeypatch):
+    calls = []
+    monkeypatch.setattr(message_loader, 'replayChanges', lambda service, store: calls.append(1))
+    replayer = ChangeReplayer(Service(online=False), store, interval=60).start()
+    # Let the first pass find nothing to send, so only the last replay could
+    time.sleep(0.05)
+    store.queue_label_change('id', 'UNREAD', added=False)
+
+    start = time.perf_counter()
+    replayer.stop()
+    assert time.perf_counter() - start < 0.5
+    time.sleep(0.05)
+    assert not calls
+    assert store.pending_label_changes()
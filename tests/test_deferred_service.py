@@ -0,0 +1,57 @@
+"""Tests of DeferredService connecting and reconnecting off the calling thread."""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('googleapiclient')
+
+from gmail_interface import DeferredService, OfflineError, offlineService
+
+
+def test_access_waits_for_the_first_connection():
+    service = DeferredService(lambda: (time.sleep(0.05), 'service')[1])
+    assert service.upper() == 'SERVICE'
+    assert service.is_online()
+
+
+def test_reconnect_runs_in_the_background(capsys):
+    attempts = []
+    release = threading.Event()
+
+    def connect():
+        attempts.append(threading.current_thread())
+        if len(attempts) == 1:
+            raise ConnectionError('no network')
+        release.wait(2)
+        return 'service'
+
+    service = DeferredService(connect, retry_interval=0)
+    with pytest.raises(OfflineError):
+        service.upper()
+
+    # The reconnect blocks until released, which must not hold up the caller
+    start = time.perf_counter()
+    with pytest.raises(OfflineError):
+        service.upper()
+    with pytest.raises(OfflineError):
+        service.upper()
+    assert time.perf_counter() - start < 0.5
+    release.set()
+
+    deadline = time.perf_counter() + 2
+    while not service.is_online():
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+    assert service.upper() == 'SERVICE'
+    assert len(attempts) == 2
+    assert threading.current_thread() not in attempts
+
+
+def test_offline_service_never_connects():
+    service = offlineService()
+    for _ in range(3):
+        with pytest.raises(OfflineError):
+            service.users()
+    assert not service.is_online()
@@ -0,0 +1,60 @@
+"""Tests of LazyBody sharing fetches between instances."""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('googleapiclient')
+
+import gmail_interface
+from gmail_interface import LazyBody
+
+
+class FakeService:
+    """Answers messages().get() slowly, counting the calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def get(self, userId, id, format):
+        self.calls.append(id)
+        return self
+
+    def execute(self, **kwargs):
+        time.sleep(0.05)
+        return {'payload': {'mimeType': 'text/plain', 'body': {'data': 'aGVsbG8='}}}
+
+
+@pytest.fixture(autouse=True)
+def empty_body_cache():
+    gmail_interface.body_cache.clear()
+    yield
+    gmail_interface.body_cache.clear()
+
+
+def test_instances_of_one_message_share_a_fetch():
+    service = FakeService()
+    bodies = [LazyBody(service, 'same-id', body_format='full') for _ in range(4)]
+    threads = [threading.Thread(target=body.load) for body in bodies]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert service.calls == ['same-id']
+    assert all(body.is_loaded() for body in bodies)
+    assert not gmail_interface._body_loads
+
+
+def test_different_messages_load_separately():
+    service = FakeService()
+    LazyBody(service, 'one', body_format='full').load()
+    LazyBody(service, 'two', body_format='full').load()
+    assert service.calls == ['one', 'two']
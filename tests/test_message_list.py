@@ -0,0 +1,57 @@
+"""Tests of StoredMessageList keeping its Messages while the store changes."""
+
+import pytest
+
+pytest.importorskip('googleapiclient')
+
+from message_list import StoredMessageList
+from message_store import MessageStore
+
+
+def _row(n, subject=None):
+    return (f'id{n:05}', f'thread{n}', 'Sender <s@example.com>', 'Mon, 1 Jan 2024 10:00:00 +0000',
+            subject or f'Subject {n}', n, ['INBOX'])
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MessageStore(str(tmp_path / 'store.db'))
+    store.put_headers_many(_row(n) for n in range(300))
+    yield store
+    store.close()
+
+
+def test_messages_survive_new_mail(store):
+    messages = StoredMessageList(store, 'INBOX', None, page_size=50)
+    before = [messages[i] for i in range(150)]
+
+    # Two newer messages push every row down by two, across page boundaries
+    store.put_headers_many([_row(1000), _row(1001)])
+    assert len(messages) == 302
+    after = [messages[i] for i in range(2, 152)]
+
+    assert all(old is new for old, new in zip(before, after))
+    assert [messages[i].id for i in range(2)] == ['id01001', 'id01000']
+
+
+def test_changed_rows_get_new_messages(store):
+    messages = StoredMessageList(store, 'INBOX', None)
+    before = [messages[i] for i in range(3)]
+
+    store.put_headers_many([_row(298, subject='Edited')])
+    after = [messages[i] for i in range(3)]
+
+    assert after[0] is before[0]
+    assert after[1] is not before[1] and after[1].subject == 'Edited'
+    assert after[2] is before[2]
+
+
+def test_far_pages_are_dropped(store):
+    messages = StoredMessageList(store, 'INBOX', None, page_size=10, window_pages=1)
+    for i in range(len(messages)):
+        messages.focus(i)
+        messages[i]
+    store.put_headers_many([_row(1000)])
+    messages[0]
+    assert len(messages._pages) <= 3
+    assert len(messages._previous) <= 30
@@ -0,0 +1,60 @@
+"""Tests of MessageStore's bulk header writes."""
+
+import pytest
+
+from message_store import ID_CHUNK, MessageStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MessageStore(str(tmp_path / 'store.db'))
+    yield store
+    store.close()
+
+
+def _row(n, labels=('INBOX', 'UNREAD')):
+    return (f'id{n}', f'thread{n}', f'Sender {n} <s{n}@example.com>', 'Mon, 1 Jan 2024 10:00:00 +0000',
+            f'Subject number {n}', 1700000000000 + n, list(labels))
+
+
+def test_put_headers_many_matches_put_headers(store, tmp_path):
+    single = MessageStore(str(tmp_path / 'single.db'))
+    rows = [_row(n) for n in range(10)]
+    for row in rows:
+        single.put_headers(*row)
+    store.put_headers_many(rows)
+
+    assert store.list_headers('INBOX') == single.list_headers('INBOX')
+    assert store.ids_with_label('UNREAD') == single.ids_with_label('UNREAD')
+    assert store.search('number') == single.search('number')
+    single.close()
+
+
+def test_put_headers_many_bumps_version_once(store):
+    store.put_headers_many(_row(n) for n in range(ID_CHUNK + 10))
+    assert store.version == 1
+    assert store.count_with_label('INBOX') == ID_CHUNK + 10
+    assert len(store.search('Sender', limit=ID_CHUNK + 10)) == ID_CHUNK + 10
+
+
+def test_put_headers_many_replaces_headers_and_reindexes(store):
+    store.put_headers_many([_row(1)])
+    store.put_headers_many([_row(1, labels=('INBOX',))[:4] + ('Renamed', 0, ['INBOX'])])
+
+    assert store.ids_with_label('UNREAD') == set()
+    assert [row[0] for row in store.search('Renamed')] == ['id1']
+    assert store.search('number') == []
+
+
+def test_put_headers_many_keeps_pending_changes(store):
+    store.put_headers_many([_row(1)])
+    store.queue_label_change('id1', 'UNREAD', added=False)
+    # Gmail still says unread until the change is replayed
+    store.put_headers_many([_row(1), _row(2)])
+
+    assert store.ids_with_label('UNREAD') == {'id2'}
+
+
+def test_put_headers_many_ignores_nothing(store):
+    store.put_headers_many([])
+    assert store.version == 0
@@ -0,0 +1,87 @@
+"""Tests of replace_urls() against the slicing implementation it replaced."""
+
+import random
+import re
+
+import pytest
+
+pytest.importorskip('googleapiclient')
+
+import gmail_interface
+from gmail_interface import URL_PATTERN, replace_urls, url_spans
+
+
+def old_replace_urls(text, replace, end_with=''):
+    """replace_urls() as it was before the span index: re-slice the text per match."""
+    matches = list(re.finditer(URL_PATTERN + end_with, text))
+    matches.reverse()
+    for match in matches:
+        start, end = match.span()[0], match.span()[1]
+        text = text[:start] + replace + text[end:]
+    return text
+
+
+TEXTS = [
+    '',
+    'no links here',
+    'see https://example.com for details',
+    'https://example.com/path/to/page at the start',
+    'at the end http://example.com/a/b',
+    # Query strings
+    'search https://www.google.com/search?q=mimi+mail&hl=en now',
+    'track http://t.example.com/c?id=123&utm_source=mail&utm_medium=email.',
+    # Fragments
+    'jump to https://docs.python.org/3/library/re.html#re.finditer please',
+    'anchor only http://example.com/#top',
+    # Back to back
+    'https://a.example.com/x https://b.example.com/y',
+    'https://a.example.com/xhttps://b.example.com/y',
+    'http://one.com,http://two.com;http://three.com/?a=1#f',
+    '(https://example.com/paren) [ftp://files.example.com/pub]',
+    'mailto:someone@example.com is not a URL, but s3://bucket/key is',
+    'line one http://example.com/1\nline two http://example.com/2?x=y\n',
+    'unicode café https://example.com/caf%C3%A9?q=é done',
+]
+
+END_WITH = [r'\.pdf', r'\.(png|jpg)', r'#top']
+
+
+def _random_texts(count, seed=0):
+    """Strings mixing words, URL pieces and the characters the pattern cares about."""
+    rng = random.Random(seed)
+    pieces = ['http://', 'https://', 'ftp://', 'example.com', '/path', '?q=1', '&b=2', '#frag', '%20',
+              '-', '_', '.pdf', '.png', ' ', ' ', '\n', 'word', 'x', ':', '//', '=', '(', ')']
+    return [''.join(rng.choice(pieces) for _ in range(rng.randint(0, 30))) for _ in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def empty_span_cache():
+    gmail_interface._url_span_cache.clear()
+
+
+@pytest.mark.parametrize('text', TEXTS)
+@pytest.mark.parametrize('replace', ['[URL]', ''], ids=['screen', 'speech'])
+def test_matches_old_implementation(text, replace):
+    assert replace_urls(text, replace) == old_replace_urls(text, replace)
+
+
+@pytest.mark.parametrize('text', TEXTS + ['get http://example.com/report.pdf and https://x.com/a.png#top'])
+@pytest.mark.parametrize('end_with', END_WITH)
+def test_end_with_matches_old_implementation(text, end_with):
+    assert replace_urls(text, '[URL]', end_with) == old_replace_urls(text, '[URL]', end_with)
+
+
+def test_screen_and_speech_variants_share_spans():
+    text = 'read https://example.com/a?b=c#d then https://example.com/e'
+    screen = replace_urls(text, '[URL]')
+    speech = replace_urls(text, '')
+    assert screen == 'read [URL] then [URL]'
+    assert speech == 'read  then '
+    assert url_spans(text) is url_spans(text)
+
+
+def test_random_texts_match_old_implementation():
+    for text in _random_texts(2000):
+        for replace in ('[URL]', ''):
+            assert replace_urls(text, replace) == old_replace_urls(text, replace), text
+        assert replace_urls(text, '', r'\.pdf') == old_replace_urls(text, '', r'\.pdf'), text
@@ -0,0 +1,184 @@
+"""Tests of SpeechController against a fake pyttsx3 engine."""
+
+import sys
+import time
+import types
+
+import pytest
+
+import speech_controller
+from speech_controller import SpeechController
+
+# Seconds the fake engine takes per word
+WORD_TIME = 0.02
+
+# Longest acceptable time from stop() to the engine being stopped
+STOP_BOUND = 0.25
+
+
+class _IteratingDriver:
+    """A driver whose iterate() is a generator, as startLoop(False) needs."""
+    def __init__(self, engine):
+        self._engine = engine
+
+    def iterate(self):
+        while True:
+            self._engine.step()
+            yield
+
+
+class _PlainDriver:
+    """A driver like pyttsx3 2.99's espeak, whose iterate() is a plain function."""
+    def iterate(self):
+        raise TypeError("'NoneType' object is not an iterator")
+
+
+class FakeEngine:
+    """Speaks one word per step, firing the callbacks pyttsx3 would."""
+
+    def __init__(self, iterating=True):
+        self.proxy = types.SimpleNamespace(_driver=_IteratingDriver(self) if iterating else _PlainDriver())
+        self.callbacks = []
+        self.queue = []
+        self.current = None
+        self.spoken = []
+        self.started = []
+        self.stopped_at = []
+        self._loop = None
+        self.fail_next = False
+
+    def connect(self, topic, callback):
+        self.callbacks.append((topic, callback))
+
+    def _fire(self, topic, *args):
+        for name, callback in self.callbacks:
+            if name == topic:
+                callback(*args)
+
+    def setProperty(self, name, value):
+        pass
+
+    def getProperty(self, name):
+        return 'voice' if name == 'voice' else None
+
+    def say(self, text, name=None):
+        self.queue.append((text, name))
+
+    def save_to_file(self, text, path, name=None):
+        self.queue.append((text, name))
+
+    def stop(self):
+        self.stopped_at.append(time.perf_counter())
+        self.queue.clear()
+        if self.current is not None:
+            _, name, _ = self.current
+            self.current = None
+            self._fire('finished-utterance', name, False)
+
+    def step(self):
+        if self.current is None:
+            if not self.queue:
+                return
+            text, name = self.queue.pop(0)
+            self.started.append(text)
+            self.current = (text, name, text.split())
+            self._fire('started-utterance', name)
+        text, name, words = self.current
+        if words:
+            words.pop(0)
+            self._fire('started-word', name, 0, 0)
+            time.sleep(WORD_TIME)
+        if self.current is not None and not self.current[2]:
+            self.current = None
+            self.spoken.append(text)
+            self._fire('finished-utterance', name, True)
+
+    def startLoop(self, useDriverLoop=True):
+        self._loop = self.proxy._driver.iterate()
+
+    def _maybe_fail(self):
+        if self.fail_next:
+            self.fail_next = False
+            raise RuntimeError('driver failure')
+
+    def iterate(self):
+        self._maybe_fail()
+        next(self._loop)
+
+    def endLoop(self):
+        self._loop = None
+
+    def runAndWait(self):
+        self._maybe_fail()
+        while self.queue or self.current is not None:
+            self.step()
+
+
+@pytest.fixture(params=[True, False], ids=['iterate', 'runAndWait'])
+def engine(request, monkeypatch):
+    engine = FakeEngine(iterating=request.param)
+    monkeypatch.setitem(sys.modules, 'pyttsx3', types.SimpleNamespace(init=lambda: engine))
+    return engine
+
+
+@pytest.fixture
+def speech(engine):
+    speech = SpeechController()
+    yield speech
+    speech.shutdown()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, 'timed out'
+        time.sleep(0.005)
+
+
+def test_driver_detection(engine):
+    assert speech_controller._can_iterate(engine) == isinstance(engine.proxy._driver, _IteratingDriver)
+
+
+def test_stop_latency_is_bounded(engine, speech):
+    speech.speak('word ' * 200)
+    wait_for(lambda: engine.started)
+    time.sleep(5 * WORD_TIME)
+    stop_called = time.perf_counter()
+    speech.stop()
+    wait_for(lambda: speech.stats()['stops'] == 1)
+
+    assert speech.stats()['stop_latency_max'] < STOP_BOUND
+    assert engine.stopped_at[-1] - stop_called < STOP_BOUND
+    assert not engine.spoken
+
+
+def test_stop_cancels_deferred_speech(engine, speech):
+    speech.speak('first ' * 200)
+    wait_for(lambda: engine.started)
+    # Taken in while speaking, so it waits in the worker rather than the queue
+    speech.speak('second')
+    time.sleep(5 * WORD_TIME)
+    speech.stop()
+    wait_for(lambda: speech.stats()['stops'] == 1)
+    time.sleep(10 * WORD_TIME)
+
+    assert engine.started == ['first ' * 200]
+    assert speech.stats()['dropped'] == 1
+
+
+def test_speech_after_stop_is_spoken(engine, speech):
+    speech.speak('first ' * 200)
+    wait_for(lambda: engine.started)
+    speech.stop()
+    speech.speak('second')
+    wait_for(lambda: 'second' in engine.spoken)
+
+
+def test_driver_error_does_not_end_speech(engine, speech, capsys):
+    engine.fail_next = True
+    speech.speak('one two three')
+    wait_for(lambda: not engine.fail_next)
+    wait_for(lambda: not speech.is_speaking())
+    assert 'Speech error' in capsys.readouterr().err
+    speech.speak('after the error')
+    wait_for(lambda: 'after the error' in engine.spoken)
@@ -0,0 +1,72 @@
+"""Tests of MailViews listing labels without blocking the caller."""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('googleapiclient')
+
+import views
+from views import SYSTEM_LABELS, MailViews
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, 'timed out'
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    counted = []
+    monkeypatch.setattr(views, 'getUnreadCounts',
+                        lambda service, label_ids: counted.extend(label_ids) or {i: 1 for i in label_ids})
+    return counted
+
+
+def test_labels_do_not_wait_for_the_network(monkeypatch, counted):
+    release = threading.Event()
+
+    def get_labels(service):
+        release.wait(2)
+        return [{'id': 'Label_2', 'name': 'zebra', 'type': 'user'},
+                {'id': 'Label_1', 'name': 'Apple', 'type': 'user'},
+                {'id': 'CHAT', 'name': 'CHAT', 'type': 'system'}]
+    monkeypatch.setattr(views, 'getLabels', get_labels)
+
+    mail_views = MailViews(None, None)
+    start = time.perf_counter()
+    assert mail_views.labels() == SYSTEM_LABELS
+    mail_views.refresh_counts()
+    assert time.perf_counter() - start < 0.5
+    assert mail_views.labels_loading() and mail_views.counts_loading()
+
+    release.set()
+    wait_for(lambda: not mail_views.counts_loading())
+    assert mail_views.labels() == SYSTEM_LABELS + [('Label_1', 'Apple'), ('Label_2', 'zebra')]
+    # Counts asked for before the user's labels arrived are fetched for them too
+    assert set(mail_views.unread_counts()) == {label_id for label_id, _ in mail_views.labels()}
+
+
+def test_failed_listing_is_remembered(monkeypatch, counted, capsys):
+    calls = []
+
+    def get_labels(service):
+        calls.append(1)
+        raise ConnectionError('offline')
+    monkeypatch.setattr(views, 'getLabels', get_labels)
+
+    mail_views = MailViews(None, None)
+    mail_views.labels()
+    wait_for(lambda: not mail_views.labels_loading())
+    for _ in range(3):
+        assert mail_views.labels() == SYSTEM_LABELS
+    assert not mail_views.labels_loading()
+    assert len(calls) == 1
+    assert 'Failed to list labels' in capsys.readouterr().err
+
+    monkeypatch.setattr(views, 'LABELS_RETRY_INTERVAL', 0)
+    mail_views.labels()
+    wait_for(lambda: len(calls) == 2)